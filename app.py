@@ -1,14 +1,65 @@
 import streamlit as st
-import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+import streamlit.components.v1 as components
 import urllib.parse
 import json
 import hashlib
+import hmac
+import uuid
 from typing import Dict, List
-import math
+import os
+import time
+import logging
 from datetime import datetime
 from collections import defaultdict
+from functools import partial
+
+from cart import Cart
+from catalog import CATEGORY_SEPARATOR, SUB_CATEGORY_SEPARATOR, build_catalog, product_keys
+from catalog_diff import diff_catalogs
+from catalog_merge import MultiSourceLoader
+from catalog_shared import SharedCatalogStore, default_shared_dir
+from catalog_sources import source_from_secrets, sources_from_secrets
+from catalog_store import CatalogStore
+from listing import LISTING_CACHE_SIZE, PRODUCTS_PER_PAGE, LRUCache, cached_listing
+from metrics import (DEFAULT_WRITE_SECONDS, REGISTRY, observe, span, start_file_exporter, start_http_exporter,
+                     timed)
+from profiling import profile_rerun
+from rendering import VIRTUAL_WINDOW_ROWS, client_catalog_payload, product_page_html, window_rows
+from search import get_search_index
+from sorting import SORT_LABELS
+
+# Seconds between background catalog refreshes, overridable with [catalog] refresh_seconds
+DEFAULT_REFRESH_SECONDS = 300
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Product table rendering, overridable with [ui] table_mode:
+# "widgets" (one element per cell), "html" (one HTML table per page) or "virtual" (infinite scroll)
+DEFAULT_TABLE_MODE = "widgets"
+# Where search runs, overridable with [ui] search_mode:
+# "server" (every keystroke reruns the script) or "client" (the browser searches a cached copy)
+DEFAULT_SEARCH_MODE = "server"
+# Where the parsed catalog is kept for warm restarts, overridable with [catalog] snapshot_path
+DEFAULT_SNAPSHOT_PATH = os.path.join(APP_DIR, ".catalog_cache", "catalog.snap")
+# How often an open page checks for a new catalog version while its cart has items
+CATALOG_WATCH_SECONDS = 30
+# Per-stage rerun timings in Prometheus text format, overridable with [metrics] path ("" disables the file)
+DEFAULT_METRICS_PATH = os.path.join(APP_DIR, ".catalog_cache", "metrics.prom")
+# Where profiled reruns are saved, overridable with [profiling] directory
+DEFAULT_PROFILE_DIR = os.path.join(APP_DIR, ".catalog_cache", "profiles")
+
+logger = logging.getLogger(__name__)
+
+# Renders a whole product page as one HTML table and reports ➕/➖ clicks back
+product_table_component = components.declare_component(
+    "product_table", path=os.path.join(APP_DIR, "components", "product_table")
+)
+# Virtualized list over the whole listing, fed one window of rows at a time
+product_list_component = components.declare_component(
+    "product_list", path=os.path.join(APP_DIR, "components", "product_list")
+)
+# Search, filters and pages in the browser over a copy of the catalog downloaded once per version
+catalog_browser_component = components.declare_component(
+    "catalog_browser", path=os.path.join(APP_DIR, "components", "catalog_browser")
+)
 
 # Configure page
 st.set_page_config(
@@ -19,6 +70,7 @@ st.set_page_config(
 )
 
 # Custom CSS for modern design and Arabic support with improved mobile responsiveness
+css_started = time.perf_counter()
 st.markdown("""
 <style>
     @import url('https://fonts.googleapis.com/css2?family=Cairo:wght@300;400;600;700&display=swap');
@@ -638,10 +690,11 @@ st.markdown("""
     }
 </style>
 """, unsafe_allow_html=True)
+observe("css", time.perf_counter() - css_started)
 
 # Initialize session state
 if 'cart' not in st.session_state:
-    st.session_state.cart = {}
+    st.session_state.cart = Cart()
 if 'current_page' not in st.session_state:
     st.session_state.current_page = 1
 if 'show_order_form' not in st.session_state:
@@ -649,116 +702,208 @@ if 'show_order_form' not in st.session_state:
 if 'search_query' not in st.session_state:
     st.session_state.search_query = ""
 
-@st.cache_data
+def fetch_catalog(source):
+    """Fetch and parse the catalog with structure: الفئة, البند, المنشأ, السعر"""
+    headers, data_rows = source.fetch()
+    return build_catalog(headers, data_rows)
+
+def prepare_catalog(catalog):
+    """Build the per-version indexes in the loader thread, before sessions see the catalog"""
+    if catalog.validation:
+        # Rejected rows are left out of the catalog, the office fixes them in the sheet
+        logger.warning("Catalog validation: %s", catalog.validation.summary())
+    get_search_index(catalog)
+    product_keys(catalog)
+
+def diff_catalog(old, new):
+    """Compare a fresh load with the current catalog, reusing the indexes it left unchanged"""
+    changes = diff_catalogs(old, new)
+    if changes:
+        logger.info("Catalog refresh: %s", changes.summary())
+    return changes
+
+@st.cache_resource
+def start_metrics_export():
+    """Export the stage timings of every session's reruns, once per process"""
+    metrics_config = dict(st.secrets.get("metrics", {}))
+    path = metrics_config.get("path", DEFAULT_METRICS_PATH)
+    if path:
+        start_file_exporter(path, float(metrics_config.get("write_seconds", DEFAULT_WRITE_SECONDS)))
+    port = int(metrics_config.get("port", 0))
+    if port:
+        # Bound to localhost unless [metrics] host says otherwise
+        start_http_exporter(port, metrics_config.get("host", "127.0.0.1"))
+    return True
+
+def get_profile_directory():
+    """Profile directory while this session has profiling switched on, else None
+    
+    Opening the app with ?profile=<[profiling] token> turns profiling on for the
+    session and ?profile=off turns it off. Without a token in the secrets the
+    query parameter is ignored.
+    """
+    profiling_config = dict(st.secrets.get("profiling", {}))
+    token = str(profiling_config.get("token", ""))
+    if not token:
+        return None
+    requested = st.query_params.get("profile")
+    if requested == "off":
+        st.session_state.profiling = False
+    elif requested and hmac.compare_digest(requested.encode("utf-8"), token.encode("utf-8")):
+        st.session_state.profiling = True
+    if not st.session_state.get("profiling"):
+        return None
+    return profiling_config.get("directory", DEFAULT_PROFILE_DIR)
+
+def get_profile_label():
+    """Session id and rerun number, so one session's profiles sort together"""
+    if 'profile_session' not in st.session_state:
+        st.session_state.profile_session = uuid.uuid4().hex[:8]
+        st.session_state.profile_reruns = 0
+    st.session_state.profile_reruns += 1
+    return f"{st.session_state.profile_session}-{st.session_state.profile_reruns:04d}"
+
+@st.cache_resource
+def get_catalog_store():
+    """Process-wide catalog store, refreshed in the background for all sessions"""
+    catalog_config = dict(st.secrets.get("catalog", {}))
+    refresh_seconds = float(catalog_config.get("refresh_seconds", DEFAULT_REFRESH_SECONDS))
+    snapshot_path = catalog_config.get("snapshot_path", DEFAULT_SNAPSHOT_PATH)
+    
+    sources = sources_from_secrets(st.secrets)
+    if sources:
+        # Several worksheets or spreadsheets, fetched in parallel and merged into one catalog
+        snapshot_dir = os.path.join(os.path.dirname(snapshot_path), "sources") if snapshot_path else None
+        loader = MultiSourceLoader(sources, snapshot_dir=snapshot_dir)
+        source_key = loader.describe()
+    else:
+        # Google Sheets by default, or a local CSV/SQLite catalog from the [catalog] secrets
+        source = source_from_secrets(st.secrets)
+        loader = lambda: fetch_catalog(source)
+        source_key = source.describe()
+    store = CatalogStore(loader, refresh_seconds=refresh_seconds, snapshot_path=snapshot_path,
+                         source_key=source_key, prepare=prepare_catalog, diff=diff_catalog)
+    if catalog_config.get("shared", False):
+        # One app process fetches and publishes each version; the others map what it published
+        shared_dir = catalog_config.get("shared_dir") or default_shared_dir(APP_DIR, source_key)
+        store = SharedCatalogStore(store, shared_dir)
+    # Serves the on-disk snapshot from the last run while the first fetch runs behind it
+    store.start()
+    return store
+
+@timed("catalog")
 def load_google_sheet():
-    """Load data from Google Sheets with new structure: الفئة, البند, المنشأ, السعر"""
+    """Return the last-known-good catalog snapshot; only the very first load waits on the source"""
     try:
-        # Get credentials from Streamlit secrets
-        credentials_dict = dict(st.secrets["gcp_service_account"])
-        # Define the required scopes for Google Sheets
-        scopes = [
-            'https://www.googleapis.com/auth/spreadsheets.readonly', 
-            'https://www.googleapis.com/auth/drive.readonly' 
-        ]
-        # Create credentials with proper scopes
-        credentials = Credentials.from_service_account_info(credentials_dict, scopes=scopes)
-        # Connect to Google Sheets
-        gc = gspread.authorize(credentials)
-        sheet_id = st.secrets["google"]["sheet_id"]
-        sheet = gc.open_by_key(sheet_id).sheet1
-        
-        # Get all values, including empty rows
-        all_values = sheet.get_all_values()
-        headers = all_values[0]
-        data_rows = all_values[1:]
-        
-        processed_data = []
-        global_product_index = 0
-        
-        for row in data_rows:
-            if not any(cell.strip() for cell in row):
-                processed_data.append({
-                    'type': 'sub_category_separator',
-                    'category': ''
-                })
-            else:
-                product_data = {}
-                for i, header in enumerate(headers):
-                    value = row[i]
-                    if header == 'السعر':
-                        try:
-                            value = float(value)
-                        except ValueError:
-                            value = 0.0
-                    product_data[header] = value
-                
-                processed_data.append({
-                    'type': 'product',
-                    'data': product_data,
-                    'global_id': global_product_index
-                })
-                global_product_index += 1
-        
-        df = pd.DataFrame([item['data'] for item in processed_data if item['type'] == 'product'])
-        required_columns = ['الفئة', 'البند', 'المنشأ', 'السعر']
-        for col in required_columns:
-            if col not in df.columns:
-                st.error(f"Missing required column: {col}")
-                return pd.DataFrame()
-                
-        df = df.dropna(subset=['البند'])
-        df = df[df['البند'] != '']
-        df = df.sort_values(['الفئة', 'البند'])
-        
-        return processed_data
+        return get_catalog_store().get()
     except Exception as e:
         st.error(f"Error loading Google Sheet: {str(e)}")
-        return []
+        return None
 
-def group_products_by_category(data_list):
-    """Group products by category and add separators, handling sub-category separators"""
-    if not data_list:
-        return []
-        
-    grouped_products = []
-    current_category = None
+def get_table_mode():
+    """Product table rendering mode from the [ui] secrets section"""
+    return dict(st.secrets.get("ui", {})).get("table_mode", DEFAULT_TABLE_MODE)
+
+def get_search_mode():
+    """Search mode from the [ui] secrets section; browsers that cannot run client search fall back to the server"""
+    if st.session_state.get('client_search_unsupported'):
+        return "server"
+    return dict(st.secrets.get("ui", {})).get("search_mode", DEFAULT_SEARCH_MODE)
+
+@st.cache_resource
+def get_listing_cache():
+    """LRU cache of filtered, grouped listings shared by all sessions, its counters exported with the timings"""
+    cache = LRUCache(LISTING_CACHE_SIZE)
+    REGISTRY.register_value("elmohandes_listing_cache_hits_total",
+                            "Listing lookups answered from the cache.", lambda: cache.hits, kind="counter")
+    REGISTRY.register_value("elmohandes_listing_cache_misses_total",
+                            "Listing lookups that computed the listing.", lambda: cache.misses, kind="counter")
+    REGISTRY.register_value("elmohandes_listing_cache_entries",
+                            "Listings held in the cache.", lambda: cache.stats()['size'])
+    return cache
+
+def display_catalog_freshness():
+    """Show when prices were last refreshed and how often they refresh"""
+    store = get_catalog_store()
+    snapshot = store.snapshot
+    if snapshot is None:
+        return
+    last_refresh = datetime.fromtimestamp(snapshot.loaded_at).strftime("%Y-%m-%d %H:%M:%S")
+    if store.refresh_seconds > 0:
+        interval = f"كل {store.refresh_seconds / 60:g} دقيقة"
+    else:
+        interval = "التحديث التلقائي متوقف"
+    saved_copy = " (نسخة محفوظة)" if snapshot.from_disk else ""
+    st.caption(f"🕒 آخر تحديث للأسعار: {last_refresh}{saved_copy} • {interval}")
+    # With several sources, name the ones served from their last good copy
+    stale_sources = [status.label for status in getattr(store.loader, "status", []) if status.fallback]
+    if stale_sources:
+        st.caption(f"⚠️ تعذر تحديث: {'، '.join(stale_sources)} (يتم عرض آخر نسخة محفوظة)")
+
+def display_validation_report(catalog):
+    """Rows the last load rejected or coerced, for the office; shown with [ui] show_validation_report"""
+    report = catalog.validation
+    if not report or not dict(st.secrets.get("ui", {})).get("show_validation_report", False):
+        return
+    with st.expander(f"⚠️ تقرير مراجعة البيانات: {report.rejected} صف مرفوض، {report.coerced} سعر معدل"):
+        for reason, count in report.counts.items():
+            st.markdown(f"**{reason}** ({count})")
+            st.markdown("\n".join(f"- صف {row_number}: `{value}`" for row_number, value in report.examples[reason]))
+
+def update_quantity(catalog, product_id: int, change: int):
+    """Update product quantity in cart
     
-    for item in data_list:
-        if item['type'] == 'product':
-            product = item['data']
-            category = product['الفئة']
-            
-            if current_category is not None and category != current_category:
-                grouped_products.append({
-                    'type': 'category_separator',
-                    'category': category
-                })
-                
-            grouped_products.append(item)
-            current_category = category
-            
-        elif item['type'] == 'sub_category_separator':
-            grouped_products.append(item)
-            
-    return grouped_products
+    Also the ➕/➖ button callback: it runs before the rerun, so the row renders with the new quantity.
+    """
+    st.session_state.cart.change(catalog, product_id, change)
 
-def update_quantity(product_name: str, change: int):
-    """Update product quantity in cart"""
-    if product_name not in st.session_state.cart:
-        st.session_state.cart[product_name] = {'quantity': 0, 'price': 0.0}
-        
-    new_quantity = st.session_state.cart[product_name]['quantity'] + change
-    st.session_state.cart[product_name]['quantity'] = max(0, new_quantity)
+def reprice_cart(catalog, catalog_version: int):
+    """Move the cart onto the current catalog version, once per version"""
+    cart = st.session_state.cart
+    if cart.catalog_version == catalog_version:
+        return
+    if not cart:
+        cart.catalog_version = catalog_version
+        return
+    repriced, removed = cart.reprice(catalog, catalog_version)
+    for line in removed:
+        st.warning(f"⚠️ تم حذف {line.name} ({line.origin}) من الطلبية لأنه لم يعد متوفراً")
+    if repriced:
+        # Kept until dismissed, a quantity change right after must not hide it
+        st.session_state.price_notices = [
+            f"{line.name} ({line.origin}): كان {old_price} وأصبح {line.price} ج.م" for line, old_price in repriced
+        ]
+        st.toast("💱 تم تحديث أسعار بعض المنتجات في طلبيتك")
+
+def dismiss_price_notices():
+    st.session_state.price_notices = []
+
+def display_price_notices():
+    """Items in the cart whose price changed with the last catalog refresh"""
+    notices = st.session_state.get('price_notices')
+    if not notices:
+        return
+    st.warning("💱 تغيرت أسعار هذه المنتجات في طلبيتك، والإجمالي محسوب بالأسعار الجديدة:\n\n"
+               + "\n".join(f"- {notice}" for notice in notices))
+    st.button("تم", key="dismiss_price_notices", on_click=dismiss_price_notices)
+
+@st.fragment(run_every=CATALOG_WATCH_SECONDS)
+def watch_catalog_version(version: int):
+    """Reload the page when a background refresh publishes a new version and the cart has items
     
-    if st.session_state.cart[product_name]['quantity'] == 0:
-        del st.session_state.cart[product_name]
+    Without this an idle page would keep old prices on screen until the
+    customer clicks something.
+    """
+    snapshot = get_catalog_store().snapshot
+    if snapshot is not None and snapshot.version != version and st.session_state.cart:
+        st.rerun()
 
 def get_cart_summary():
-    """Get cart summary statistics"""
-    total_items = sum(item['quantity'] for item in st.session_state.cart.values())
-    total_cost = sum(item['quantity'] * item['price'] for item in st.session_state.cart.values())
-    return total_items, total_cost
+    """Get cart summary statistics, kept up to date by the cart on every change"""
+    cart = st.session_state.cart
+    return cart.total_items, round(cart.total_cost, 2)
 
+@timed("whatsapp_message")
 def generate_whatsapp_message():
     """Generate WhatsApp message with proper Arabic formatting"""
     if not st.session_state.cart:
@@ -774,11 +919,11 @@ def generate_whatsapp_message():
         ""
     ]
     
-    for product_name, details in st.session_state.cart.items():
-        qty = details['quantity']
-        price = details['price']
-        subtotal = qty * price
-        message_lines.append(f"🔹 *{product_name}*")
+    for line in st.session_state.cart:
+        qty = line.quantity
+        price = line.price
+        subtotal = line.subtotal
+        message_lines.append(f"🔹 *{line.name}* ({line.origin})")
         message_lines.append(f"   - الكمية: {qty}")
         message_lines.append(f"   - السعر: {price} ج.م")
         message_lines.append(f"   - الإجمالي: *{subtotal} ج.م*")
@@ -797,9 +942,9 @@ def generate_whatsapp_message():
     message = "\n".join(message_lines)
     return urllib.parse.quote(message)
 
-def display_products_table(grouped_products):
+def display_products_table(catalog, page_rows):
     """Display products in a responsive table format with category and sub-category separators"""
-    if not grouped_products:
+    if not page_rows:
         st.warning("لا توجد منتجات للعرض")
         return
         
@@ -818,27 +963,22 @@ def display_products_table(grouped_products):
     st.markdown('</div>', unsafe_allow_html=True)
     
     # Display each item (product or separator)
-    for i, item in enumerate(grouped_products):
-        if item['type'] == 'category_separator':
+    for row in page_rows:
+        if row == CATEGORY_SEPARATOR:
             # Display main category separator
             st.markdown('<div class="category-separator"></div>', unsafe_allow_html=True)
-        elif item['type'] == 'sub_category_separator':
+        elif row == SUB_CATEGORY_SEPARATOR:
             # Display sub-category separator
             st.markdown('<div class="sub-category-separator"></div>', unsafe_allow_html=True)
-        elif item['type'] == 'product':
-            product = item['data']
-            unique_key_base = item['global_id']
-            product_name = product['البند']
-            origin = product['المنشأ']
-            price = product['السعر']
+        else:
+            unique_key_base = row
+            product_name = catalog.names[row]
+            origin = catalog.origin(row)
+            price = catalog.prices[row]
             
             # Get current quantity from cart
-            current_qty = st.session_state.cart.get(product_name, {}).get('quantity', 0)
+            current_qty = st.session_state.cart.quantity(row)
             subtotal = current_qty * price if current_qty > 0 else 0
-            
-            # Update cart with current price
-            if product_name in st.session_state.cart:
-                st.session_state.cart[product_name]['price'] = price
                 
             # Create table row with cells that adjust to content size
             st.markdown('<div class="table-row">', unsafe_allow_html=True)
@@ -861,15 +1001,11 @@ def display_products_table(grouped_products):
             st.markdown('<div class="table-cell">', unsafe_allow_html=True)
             col1, col2 = st.columns([1, 1])
             with col1:
-                if st.button("➖", key=f"minus_{unique_key_base}", help="تقليل الكمية", use_container_width=True):
-                    update_quantity(product_name, -1)
-                    st.rerun()
+                st.button("➖", key=f"minus_{unique_key_base}", help="تقليل الكمية", use_container_width=True,
+                          on_click=update_quantity, args=(catalog, row, -1))
             with col2:
-                if st.button("➕", key=f"plus_{unique_key_base}", help="زيادة الكمية", use_container_width=True):
-                    if product_name not in st.session_state.cart:
-                        st.session_state.cart[product_name] = {'quantity': 0, 'price': price}
-                    update_quantity(product_name, 1)
-                    st.rerun()
+                st.button("➕", key=f"plus_{unique_key_base}", help="زيادة الكمية", use_container_width=True,
+                          on_click=update_quantity, args=(catalog, row, 1))
             st.markdown('</div>', unsafe_allow_html=True)
             
             # Subtotal cell
@@ -880,6 +1016,107 @@ def display_products_table(grouped_products):
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
+def display_products_html(catalog, page_rows):
+    """Display the page's product table as a single HTML block through the product_table component"""
+    if not page_rows:
+        st.warning("لا توجد منتجات للعرض")
+        return
+    
+    cart = st.session_state.cart
+    quantities = {row: cart.quantity(row) for row in page_rows if row >= 0}
+    
+    # The click is applied in the callback, before the rerun it triggers draws the new quantity and totals
+    product_table_component(html=product_page_html(catalog, page_rows, quantities),
+                            key="product_table", default=None, on_change=partial(apply_table_event, catalog))
+
+def new_component_event(key, seen_key):
+    """The component's current value if it is an event not acted on yet, else None
+    
+    Components keep returning their last event, so each nonce is acted on only
+    once; seen_key keeps the last nonce in session state.
+    """
+    event = st.session_state.get(key)
+    if not event or event.get('nonce') == st.session_state.get(seen_key):
+        return None
+    st.session_state[seen_key] = event['nonce']
+    return event
+
+def apply_table_event(catalog):
+    """product_table on_change callback: apply a ➕/➖ click to the cart"""
+    event = new_component_event("product_table", "last_table_event")
+    if event is None:
+        return
+    row = event.get('gid', -1)
+    if 0 <= row < len(catalog):
+        update_quantity(catalog, row, int(event.get('change', 0)))
+
+def display_products_virtual(catalog, listing):
+    """Display the whole listing as an infinite-scroll list, sending only the rows near the viewport"""
+    window = st.session_state.get('virtual_window')
+    start = window[1] if window and window[0] == listing.token else 0
+    
+    cart = st.session_state.cart
+    rows = listing.rows
+    quantities = {row: cart.quantity(row) for row in rows[start:start + VIRTUAL_WINDOW_ROWS] if row >= 0}
+    # Scrolls and clicks are applied in the callback, before the rerun they trigger draws the new window or quantity
+    product_list_component(token=listing.token, total=len(rows), start=start,
+                           rows=window_rows(catalog, rows, start, quantities),
+                           key="product_list", default=None, on_change=partial(apply_list_event, catalog, listing))
+
+def apply_list_event(catalog, listing):
+    """product_list on_change callback: move the window or apply a ➕/➖ click"""
+    event = new_component_event("product_list", "last_list_event")
+    # Events from a list of another listing are stale
+    if event is None or event.get('token') != listing.token:
+        return
+    if event.get('type') == 'window':
+        st.session_state.virtual_window = (listing.token, max(0, min(int(event['start']), len(listing.rows) - 1)))
+    elif event.get('type') == 'quantity':
+        row = event.get('gid', -1)
+        if 0 <= row < len(catalog):
+            update_quantity(catalog, row, int(event.get('change', 0)))
+
+@st.fragment
+@timed("client_catalog")
+def display_client_catalog(catalog):
+    """Search, filter and page the catalog in the browser; the server only hears about cart changes
+    
+    The catalog goes to the browser only when it reports having no copy under
+    the current etag, and then in exactly one rerun. Every other rerun sends
+    just the etag and the cart quantities.
+    """
+    if st.session_state.get('client_search_unsupported'):
+        # The browser cannot search on its own: the whole page switches to server search
+        st.rerun()
+    etag, payload = client_catalog_payload(catalog)
+    cart = st.session_state.cart
+    send_payload = st.session_state.get('client_catalog_requested') == etag
+    if send_payload:
+        st.session_state.client_catalog_requested = None
+    # Events are applied in the callback, before the rerun they trigger sends the catalog or the new quantities
+    catalog_browser_component(etag=etag, payload=payload if send_payload else None,
+                              quantities={str(line.product_id): line.quantity for line in cart},
+                              per_page=PRODUCTS_PER_PAGE, key="catalog_browser", default=None,
+                              on_change=partial(apply_browser_event, catalog, etag))
+    
+    display_cart_review()
+
+def apply_browser_event(catalog, etag):
+    """catalog_browser on_change callback: a request for the catalog, a ➕/➖ click, or no client search"""
+    event = new_component_event("catalog_browser", "last_browser_event")
+    if event is None:
+        return
+    event_type = event.get('type')
+    if event_type == 'need' and event.get('etag') == etag:
+        st.session_state.client_catalog_requested = etag
+    elif event_type == 'unsupported':
+        st.session_state.client_search_unsupported = True
+    elif event_type == 'quantity' and event.get('etag') == etag:
+        # Ids are only meaningful for the catalog version the browser was showing
+        row = event.get('gid', -1)
+        if 0 <= row < len(catalog):
+            update_quantity(catalog, row, int(event.get('change', 0)))
+
 def display_order_details():
     """Display order details in a responsive format"""
     if not st.session_state.cart:
@@ -898,15 +1135,15 @@ def display_order_details():
     """, unsafe_allow_html=True)
     
     # Product rows with mobile-friendly layout
-    for product_name, details in st.session_state.cart.items():
-        qty = details['quantity']
-        price = details['price']
-        subtotal = qty * price
+    for line in st.session_state.cart:
+        qty = line.quantity
+        price = line.price
+        subtotal = line.subtotal
         
         # Desktop version (table row)
         st.markdown(f'''
         <div class="order-detail-row">
-            <div class="order-detail-item">{product_name}</div>
+            <div class="order-detail-item">{line.name} ({line.origin})</div>
             <div class="mobile-order-details">
                 <div class="mobile-order-detail-item">
                     <div class="mobile-order-detail-label">الكمية</div>
@@ -925,11 +1162,133 @@ def display_order_details():
         ''', unsafe_allow_html=True)
 
 def navigate_to_page(new_page):
-    """Navigate to a new page"""
+    """Pagination button callback; the click's own rerun of the order area shows the new page"""
     st.session_state.current_page = new_page
-    # Scroll to the top of the products container after pagination
-    st.markdown("<script>document.querySelector('.scroll-target').scrollIntoView({ behavior: 'smooth' });</script>", unsafe_allow_html=True)
-    st.rerun()
+
+def display_order_summary():
+    """Display the summary cards and order details for the current cart"""
+    total_items, total_cost = get_cart_summary()
+    
+    # Summary cards
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown(f"""
+        <div class="summary-card">
+            <div class="summary-title">📦 عدد الأصناف</div>
+            <div class="stat-number">{total_items}</div>
+        </div>
+        """, unsafe_allow_html=True)
+    with col2:
+        st.markdown(f"""
+        <div class="summary-card">
+            <div class="summary-title">💰 الإجمالي</div>
+            <div class="stat-number">{total_cost}</div>
+            <div class="stat-label">جنيه مصري</div>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    # Order details using the new responsive display
+    display_order_details()
+
+def display_whatsapp_link():
+    """Display the WhatsApp send button with the pre-filled order message"""
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        whatsapp_number = st.secrets["whatsapp"]["number"]
+        whatsapp_message = generate_whatsapp_message()
+        whatsapp_url = f"https://wa.me/{whatsapp_number}?text={whatsapp_message}"
+        st.markdown(
+            f'<a href="{whatsapp_url}" target="_blank" class="whatsapp-btn">📱 إرسال الطلبية عبر واتساب</a>',
+            unsafe_allow_html=True
+        )
+
+def jump_to_category(category_pages):
+    """Category navigator callback: open the page where the chosen category starts"""
+    choice = st.session_state.jump_to_category
+    if choice in category_pages:
+        st.session_state.current_page = category_pages[choice]
+
+def display_category_navigator(catalog, listing):
+    """Select box that jumps straight to the page where a category starts"""
+    category_pages = {}
+    for code, page in listing.category_pages():
+        category_pages.setdefault(catalog.categories[code], page)
+    if len(category_pages) < 2:
+        return
+    st.selectbox("📂 الانتقال إلى فئة", list(category_pages), index=None, placeholder="اختر الفئة...",
+                 key="jump_to_category", on_change=jump_to_category, args=(category_pages,))
+
+@st.fragment
+@timed("order_area")
+def display_order_area(catalog, listing):
+    """Product page, pagination, order summary and WhatsApp link
+    
+    Runs as a fragment: ➕/➖ clicks and page turns rerun only this part, not the
+    CSS, catalog lookup, search and filtering above it. Streamlit fragments
+    cannot rerun each other, so everything that shows cart state lives here.
+    """
+    if get_table_mode() == "virtual":
+        # One scrolling list instead of pages
+        st.markdown("### المنتجات")
+        with span("render_table"):
+            display_products_virtual(catalog, listing)
+        display_cart_review()
+        return
+    
+    # Pages come from the listing's precomputed page index, so only this page's rows are touched
+    total_pages = max(listing.page_count, 1)
+    
+    # Ensure current page is valid
+    st.session_state.current_page = min(st.session_state.current_page, total_pages)
+    st.session_state.current_page = max(st.session_state.current_page, 1)
+    
+    if not listing.ranked:
+        display_category_navigator(catalog, listing)
+    
+    current_items = listing.page(st.session_state.current_page)
+    
+    # Display products with scroll target
+    st.markdown(f"### المنتجات ( {st.session_state.current_page}/{total_pages})")
+    
+    # Create container for products table that will be scrolled to
+    products_container = st.container()
+    with products_container, span("render_table"):
+        if get_table_mode() == "html":
+            display_products_html(catalog, current_items)
+        else:
+            display_products_table(catalog, current_items)
+    
+    # Pagination controls, as callbacks like ➕/➖: the click reruns only this fragment, already on the new page
+    if total_pages > 1:
+        current_page = st.session_state.current_page
+        col1, col2, col3, col4, col5 = st.columns([1, 1, 2, 1, 1])
+        with col1:
+            st.button("⏮️ الأولى", disabled=current_page == 1, use_container_width=True,
+                      on_click=navigate_to_page, args=(1,))
+        with col2:
+            st.button("⬅️ السابقة", disabled=current_page == 1, use_container_width=True,
+                      on_click=navigate_to_page, args=(current_page - 1,))
+        with col3:
+            st.markdown(f'<div class="page-info">{current_page}/{total_pages}</div>', 
+                      unsafe_allow_html=True)
+        with col4:
+            st.button("التالية ➡️", disabled=current_page == total_pages, use_container_width=True,
+                      on_click=navigate_to_page, args=(current_page + 1,))
+        with col5:
+            st.button("الأخيرة ⏭️", disabled=current_page == total_pages, use_container_width=True,
+                      on_click=navigate_to_page, args=(total_pages,))
+    
+    display_cart_review()
+
+def display_cart_review():
+    """Order summary, details and WhatsApp link, shown once the cart has items"""
+    if st.session_state.cart:
+        st.markdown("---")
+        display_order_summary()
+        
+        # WhatsApp send button
+        st.markdown("---")
+        display_whatsapp_link()
 
 def main():
     # Main header
@@ -940,145 +1299,88 @@ def main():
     with col2:
         if st.button("🛒 طلبية جديدة", use_container_width=True, type="primary"):
             st.session_state.show_order_form = True
-            st.session_state.cart = {}
+            st.session_state.cart = Cart()
+            st.session_state.price_notices = []
             st.session_state.current_page = 1
             st.rerun()
     
     if st.session_state.show_order_form:
-        processed_data_list = load_google_sheet()
+        snapshot = load_google_sheet()
+        catalog = snapshot.data if snapshot is not None else None
         
-        if not processed_data_list:
+        if not catalog:
             st.error("لا يمكن تحميل البيانات من Google Sheets")
             return
-            
-        # Convert processed_data_list to a DataFrame for filtering
-        df_for_filtering = pd.DataFrame([item['data'] for item in processed_data_list if item['type'] == 'product'])
         
+        display_catalog_freshness()
+        display_validation_report(catalog)
+        # Prices in the cart follow the catalog version explicitly, never as a side effect of rendering
+        reprice_cart(catalog, snapshot.version)
+        display_price_notices()
+        watch_catalog_version(snapshot.version)
+        
+        if get_search_mode() == "client":
+            # Search, filtering and pages run in the browser without rerunning the script
+            with span("render_table"):
+                display_client_catalog(catalog)
+            return
+            
         # Search functionality with filter options
         st.markdown('<div class="search-container">', unsafe_allow_html=True)
-        col1, col2 = st.columns([3, 1])
+        col1, col2, col3 = st.columns([2, 1, 1])
         
         with col1:
             search_query = st.text_input("🔍 البحث في المنتجات", 
                                        value=st.session_state.search_query, 
                                        placeholder="ابحث عن قطعة غيار...")
-        
+            # Off by default: ranking keeps only the best matches, exact search lists them all
+            fuzzy_search = st.checkbox("🔤 بحث ذكي: ترتيب النتائج حسب الأقرب مع تجاهل الأخطاء الإملائية",
+                                       value=False)
+            # Every order is a precomputed permutation, so changing it costs no re-sort
+            sort_order = st.selectbox("↕️ ترتيب المنتجات", list(SORT_LABELS), format_func=SORT_LABELS.get,
+                                      key="sort_order")
+        
+        # Facet selections are read before their widgets are drawn, since the option labels
+        # show counts from the listing; values a catalog refresh removed are dropped
+        origin_facets = [o for o in st.session_state.get('origin_facets', []) if o in catalog.origins]
+        category_facets = [c for c in st.session_state.get('category_facets', []) if c in catalog.categories]
+        st.session_state.origin_facets = origin_facets
+        st.session_state.category_facets = category_facets
+        
+        # Filter and group through the cross-session cache of listings for this catalog version
+        with span("listing"):
+            listing = cached_listing(get_listing_cache(), snapshot.version, catalog,
+                                     search_query, origin_facets, category_facets, fuzzy_search, sort_order)
+        
+        origin_counts = dict(zip(catalog.origins, listing.origin_counts))
+        category_counts = dict(zip(catalog.categories, listing.category_counts))
         with col2:
-            origin_filter = st.selectbox("تصفية حسب المنشأ", 
-                                       ["الكل"] + list(df_for_filtering['المنشأ'].unique()))
+            st.multiselect("تصفية حسب المنشأ", list(catalog.origins), key="origin_facets",
+                           placeholder="الكل", format_func=lambda o: f"{o} ({origin_counts[o]})")
+        with col3:
+            st.multiselect("تصفية حسب الفئة", list(catalog.categories), key="category_facets",
+                           placeholder="الكل", format_func=lambda c: f"{c} ({category_counts[c]})")
         
         st.markdown('</div>', unsafe_allow_html=True)
-        
-        # Filter data based on search and origin
-        filtered_products_list = []
-        for item in processed_data_list:
-            if item['type'] == 'product':
-                product = item['data']
-                match_search = True
-                match_origin = True
-                
-                if search_query:
-                    if search_query.lower() not in product['البند'].lower():
-                        match_search = False
-                        
-                if origin_filter and origin_filter != "الكل":
-                    if product['المنشأ'] != origin_filter:
-                        match_origin = False
-                        
-                if match_search and match_origin:
-                    filtered_products_list.append(item)
-            elif item['type'] == 'sub_category_separator':
-                filtered_products_list.append(item)
-                
-        # Group products by category with separators (now including sub-category separators)
-        grouped_products = group_products_by_category(filtered_products_list)
+        if listing.ranked:
+            results_label = f"**أفضل {listing.product_count} نتيجة مطابقة للبحث**"
+        else:
+            results_label = f"**عدد النتائج: {listing.product_count} منتج**"
         
         # Show results count
-        product_count = len([item for item in grouped_products if item['type'] == 'product'])
-        st.markdown(f"**عدد النتائج: {product_count} منتج**")
-        
-        # Pagination settings
-        items_per_page = 15
-        total_items = len(grouped_products)
-        total_pages = math.ceil(total_items / items_per_page) if total_items > 0 else 1
+        st.markdown(results_label)
         
-        if total_items == 0:
+        if listing.page_count == 0:
             st.warning("لا توجد منتجات تطابق البحث")
             return
-            
-        # Ensure current page is valid
-        st.session_state.current_page = min(st.session_state.current_page, total_pages)
-        st.session_state.current_page = max(st.session_state.current_page, 1)
         
-        # Calculate pagination
-        start_idx = (st.session_state.current_page - 1) * items_per_page
-        end_idx = min(start_idx + items_per_page, total_items)
-        current_items = grouped_products[start_idx:end_idx]
-        
-        # Display products with scroll target
-        st.markdown(f"### المنتجات ( {st.session_state.current_page}/{total_pages})")
-        
-        # Create container for products table that will be scrolled to
-        products_container = st.container()
-        with products_container:
-            display_products_table(current_items)
-        
-        # Pagination controls
-        if total_pages > 1:
-            col1, col2, col3, col4, col5 = st.columns([1, 1, 2, 1, 1])
-            with col1:
-                if st.button("⏮️ الأولى", disabled=st.session_state.current_page == 1, use_container_width=True):
-                    navigate_to_page(1)
-            with col2:
-                if st.button("⬅️ السابقة", disabled=st.session_state.current_page == 1, use_container_width=True):
-                    navigate_to_page(st.session_state.current_page - 1)
-            with col3:
-                st.markdown(f'<div class="page-info">{st.session_state.current_page}/{total_pages}</div>', 
-                          unsafe_allow_html=True)
-            with col4:
-                if st.button("التالية ➡️", disabled=st.session_state.current_page == total_pages, use_container_width=True):
-                    navigate_to_page(st.session_state.current_page + 1)
-            with col5:
-                if st.button("الأخيرة ⏭️", disabled=st.session_state.current_page == total_pages, use_container_width=True):
-                    navigate_to_page(total_pages)
-        
-        # Order summary and review
-        if st.session_state.cart:
-            st.markdown("---")
-            total_items, total_cost = get_cart_summary()
-            
-            # Summary cards
-            col1, col2 = st.columns(2)
-            with col1:
-                st.markdown(f"""
-                <div class="summary-card">
-                    <div class="summary-title">📦 عدد الأصناف</div>
-                    <div class="stat-number">{total_items}</div>
-                </div>
-                """, unsafe_allow_html=True)
-            with col2:
-                st.markdown(f"""
-                <div class="summary-card">
-                    <div class="summary-title">💰 الإجمالي</div>
-                    <div class="stat-number">{total_cost}</div>
-                    <div class="stat-label">جنيه مصري</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            # Order details using the new responsive display
-            display_order_details()
-            
-            # WhatsApp send button
-            st.markdown("---")
-            col1, col2, col3 = st.columns([1, 2, 1])
-            with col2:
-                whatsapp_number = st.secrets["whatsapp"]["number"]
-                whatsapp_message = generate_whatsapp_message()
-                whatsapp_url = f"https://wa.me/{whatsapp_number}?text={whatsapp_message}"
-                st.markdown(
-                    f'<a href="{whatsapp_url}" target="_blank" class="whatsapp-btn">📱 إرسال الطلبية عبر واتساب</a>',
-                    unsafe_allow_html=True
-                )
+        # Everything that depends on the cart reruns on its own when a quantity or page changes
+        display_order_area(catalog, listing)
 
 if __name__ == "__main__":
-    main()
+    start_metrics_export()
+    # st.rerun and st.stop end a rerun by raising, the span still records it
+    profile_directory = get_profile_directory()
+    profile_label = get_profile_label() if profile_directory else ""
+    with span("rerun"), profile_rerun(profile_directory, profile_label):
+        main()
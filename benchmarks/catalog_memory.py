@@ -0,0 +1,86 @@
+"""Memory used by the columnar catalog versus the old list-of-dicts rows
+
+Run from the repository root:
+
+    python benchmarks/catalog_memory.py 10000 100000
+"""
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import REQUIRED_COLUMNS, build_catalog  # noqa: E402
+
+ORIGINS = ['ياباني', 'كوري', 'صيني', 'ألماني', 'تايواني', 'أصلي']
+CATEGORIES = ['فلاتر', 'تيل فرامل', 'بوجيهات', 'سيور', 'مساعدين', 'رديتر', 'كشافات', 'جوانات']
+PARTS = ['فلتر زيت', 'فلتر هواء', 'تيل أمامي', 'تيل خلفي', 'بوجيه', 'سير مكينة', 'مساعد أمامي', 'جوان وش']
+MODELS = ['لانسر', 'فيرنا', 'ماتريكس', 'سيراتو', 'نيسان صني', 'تويوتا كورولا', 'هيونداي النترا']
+
+
+def synthetic_rows(count, seed=7):
+    """Sheet-shaped rows: category runs with occasional blank separator rows"""
+    rng = random.Random(seed)
+    rows = []
+    category = 0
+    while len(rows) < count:
+        if rng.random() < 0.02:
+            category = (category + 1) % len(CATEGORIES)
+            rows.append(['', '', '', ''])
+            continue
+        # Build each cell fresh, as gspread does, so strings are not shared
+        rows.append([
+            ''.join(CATEGORIES[category]),
+            f"{rng.choice(PARTS)} {rng.choice(MODELS)} {rng.randint(1, 9999)}",
+            ''.join(rng.choice(ORIGINS)),
+            str(rng.randint(20, 5000)),
+        ])
+    return rows
+
+
+def legacy_rows(headers, rows):
+    """The list-of-dicts row stream the app used before the columnar catalog"""
+    processed_data = []
+    global_product_index = 0
+    for row in rows:
+        if not any(cell.strip() for cell in row):
+            processed_data.append({'type': 'sub_category_separator', 'category': ''})
+            continue
+        product_data = {}
+        for i, header in enumerate(headers):
+            value = row[i]
+            if header == 'السعر':
+                try:
+                    value = float(value)
+                except ValueError:
+                    value = 0.0
+            product_data[header] = value
+        processed_data.append({'type': 'product', 'data': product_data, 'global_id': global_product_index})
+        global_product_index += 1
+    return processed_data
+
+
+def measure(build, *args):
+    """Bytes still allocated by build(*args) once it returns"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(*args)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def main(sizes):
+    print(f"{'rows':>8} {'list-of-dicts':>15} {'columnar':>12} {'ratio':>7}")
+    for size in sizes:
+        # Each representation gets its own copy of the raw cells, since the
+        # legacy rows keep references to them and the catalog keeps names
+        legacy_bytes, _ = measure(lambda: legacy_rows(REQUIRED_COLUMNS, synthetic_rows(size)))
+        columnar_bytes, _ = measure(lambda: build_catalog(REQUIRED_COLUMNS, synthetic_rows(size)))
+        print(f"{size:>8} {legacy_bytes / 2**20:>13.1f}MB {columnar_bytes / 2**20:>10.1f}MB "
+              f"{legacy_bytes / columnar_bytes:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,231 @@
+"""Timings of the app's own work per stage over synthetic catalogs of growing size
+
+For every catalog size this times, in seconds:
+
+    load       parsing a stub source's rows into the catalog, as fetch_catalog does
+    index      the per-version indexes prepare_catalog builds (search, product keys, facets)
+    search     an exact Arabic-aware name search
+    origin     the origin facet filter
+    fuzzy      ranked, typo-tolerant search
+    listing    compute_listing end to end: search plus origin filter plus grouping
+    group      group_products_by_category over the whole catalog
+    paginate        the page index of the full listing plus slicing every page
+    render_html     one page of the product table as HTML, as the html table mode builds it
+    render_widgets  one page of display_products_table, the default widget table
+
+display_products_table draws widgets and only runs inside a Streamlit
+script, so render_widgets runs app.py headless through Streamlit's AppTest
+against the same catalog as a CSV, turns pages, and reads each page's
+render_table stage timing from metrics.py. It is left out when streamlit
+is not installed. Results are written as JSON, and --compare reports
+stages that got slower than a previous run's file:
+
+    python benchmarks/catalog_suite.py --output bench.json
+    python benchmarks/catalog_suite.py --sizes 1000 10000 --compare bench.json
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from array import array
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from catalog import REQUIRED_COLUMNS, build_catalog, group_products_by_category, product_keys  # noqa: E402
+from catalog_memory import synthetic_rows  # noqa: E402
+from facets import get_facet_index, indices_from_bitmap  # noqa: E402
+from listing import Listing, compute_listing  # noqa: E402
+from metrics import REGISTRY  # noqa: E402
+from rendering import product_page_html  # noqa: E402
+from search import get_search_index  # noqa: E402
+
+DEFAULT_SIZES = [1000, 10000, 100000, 500000]
+QUERIES = ['فلتر زيت', 'تيل امامي فيرنا', 'بوجيه']
+FUZZY_QUERIES = ['فلتر زيط لانسر', 'تيل امامى فرنا']
+# Pages rendered per repeat, spread over the listing
+RENDER_PAGES = 20
+NEW_ORDER = '🛒 طلبية جديدة'
+NEXT_PAGE = 'التالية ➡️'
+# A stage is reported as a regression when its median grows by more than this
+REGRESSION_RATIO = 1.2
+
+
+class StubSource:
+    """Catalog source serving rows that are already in memory, like a Sheets download that took no time"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetch(self):
+        return REQUIRED_COLUMNS, self.rows
+
+    def describe(self):
+        return f'stub:{len(self.rows)}'
+
+
+def summary(runs):
+    return {'min': min(runs), 'median': statistics.median(runs), 'max': max(runs), 'runs': len(runs)}
+
+
+def timed(func, repeats):
+    """min, median and max seconds of func over repeats calls"""
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return summary(runs)
+
+
+def render_widgets(rows, repeats):
+    """Seconds per page of display_products_table, rendered headless by AppTest; None without streamlit"""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return None
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'catalog.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(REQUIRED_COLUMNS)
+            writer.writerows(rows)
+        app = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=600)
+        app.secrets['catalog'] = {'source': 'csv', 'path': path, 'refresh_seconds': 0, 'snapshot_path': ''}
+        app.secrets['whatsapp'] = {'number': '200000000000'}
+        app.secrets['metrics'] = {'path': ''}
+        app.secrets['ui'] = {'table_mode': 'widgets', 'search_mode': 'server'}
+        app.run()
+        next(button for button in app.button if button.label == NEW_ORDER).click().run()
+
+        render_table = REGISTRY.histogram('render_table')
+        runs = []
+        for _ in range(repeats):
+            before = render_table.sum
+            # Every rerun renders the page it lands on once
+            next(button for button in app.button if button.label == NEXT_PAGE).click().run()
+            if app.exception:
+                raise RuntimeError(f"app raised: {app.exception[0].value}")
+            runs.append(render_table.sum - before)
+    return summary(runs)
+
+
+def prepare(catalog):
+    """The indexes prepare_catalog builds in the app"""
+    get_search_index(catalog)
+    product_keys(catalog)
+    get_facet_index(catalog)
+
+
+def bench_size(size, repeats, seed):
+    source = StubSource(synthetic_rows(size, seed=seed))
+    results = {'load': timed(lambda: build_catalog(*source.fetch()), repeats)}
+    # Indexes are built once per catalog, so every repeat gets a fresh catalog, parsed off the clock
+    fresh = [build_catalog(*source.fetch()) for _ in range(repeats)]
+    results['index'] = timed(lambda: prepare(fresh.pop()), repeats)
+
+    catalog = build_catalog(*source.fetch())
+    prepare(catalog)
+    index = get_search_index(catalog)
+    facets = get_facet_index(catalog)
+    origin = catalog.origins[0]
+    origin_code = catalog.origins.index(origin)
+
+    results['search'] = timed(lambda: [index.search(query) for query in QUERIES], repeats)
+    results['origin'] = timed(lambda: indices_from_bitmap(facets.origin_mask([origin_code])), repeats)
+    results['fuzzy'] = timed(lambda: [index.fuzzy_search(query) for query in FUZZY_QUERIES], repeats)
+    results['listing'] = timed(lambda: [compute_listing(catalog, query, [origin]) for query in QUERIES], repeats)
+
+    everything = range(len(catalog))
+    results['group'] = timed(lambda: group_products_by_category(catalog, everything), repeats)
+    rows = array('i', group_products_by_category(catalog, everything))
+
+    def paginate():
+        listing = Listing(rows, len(catalog), False, catalog.category_codes)
+        for number in range(1, listing.page_count + 1):
+            listing.page(number)
+
+    results['paginate'] = timed(paginate, repeats)
+
+    listing = Listing(rows, len(catalog), False, catalog.category_codes)
+    step = max(listing.page_count // RENDER_PAGES, 1)
+    pages = [listing.page(number) for number in range(1, listing.page_count + 1, step)][:RENDER_PAGES]
+    quantities = {pages[0][1]: 2} if len(pages[0]) > 1 else {}
+    results['render_html'] = timed(lambda: [product_page_html(catalog, page, quantities) for page in pages], repeats)
+    # Per page, so the number does not depend on RENDER_PAGES
+    for key in ('min', 'median', 'max'):
+        results['render_html'][key] /= len(pages)
+
+    widgets = render_widgets(source.rows, repeats)
+    if widgets is not None:
+        results['render_widgets'] = widgets
+    return results
+
+
+def compare(current, baseline):
+    """Stages whose median grew by more than REGRESSION_RATIO, as printable lines"""
+    regressions = []
+    for size, stages in current['results'].items():
+        for stage, timing in stages.items():
+            previous = baseline.get('results', {}).get(size, {}).get(stage)
+            if not previous or not previous['median']:
+                continue
+            ratio = timing['median'] / previous['median']
+            if ratio > REGRESSION_RATIO:
+                regressions.append(f"{size:>8} {stage:<14} {previous['median'] * 1000:>10.2f}ms "
+                                   f"-> {timing['median'] * 1000:>10.2f}ms  x{ratio:.2f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='a previous results file to check for regressions')
+    args = parser.parse_args(argv)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeats': args.repeats,
+            'seed': args.seed,
+        },
+        'results': {},
+    }
+    stages = None
+    for size in args.sizes:
+        results = bench_size(size, args.repeats, args.seed)
+        report['results'][str(size)] = results
+        if stages is None:
+            stages = list(results)
+            print(f"{'rows':>8} " + ' '.join(f'{stage:>14}' for stage in stages) + '   (median ms)')
+        print(f'{size:>8} ' + ' '.join(f"{results[stage]['median'] * 1000:>14.2f}" for stage in stages),
+              flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f))
+        if regressions:
+            print(f'\nSlower than {args.compare} by more than {REGRESSION_RATIO:.1f}x:')
+            print('\n'.join(regressions))
+            return 1
+        print(f'\nNo stage slower than {args.compare} by more than {REGRESSION_RATIO:.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
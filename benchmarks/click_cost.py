@@ -0,0 +1,123 @@
+"""Server time per ➕ click, before and after the order area became a fragment
+
+Before the fragment, a ➕ click reran the whole script twice: once for the
+click and once more for the st.rerun() after it, rebuilding the CSS,
+catalog lookup, search widgets, listing and page every time. Now the click
+is an on_click callback followed by one rerun of the display_order_area
+fragment.
+
+AppTest replays every click as a full script run, fragments included, so
+for the current app the fragment's own cost is read from the order_area
+timings in metrics.py, next to the full-run time AppTest sees. For an
+older checkout, which has no metrics, the AppTest time of the click (both
+runs) is the cost. Each app runs in its own process so their modules do
+not mix; point --before at the app.py of a checkout from before the change:
+
+    git worktree add /tmp/before <commit before the fragment change>
+    python benchmarks/click_cost.py --rows 100000 --before /tmp/before/app.py
+"""
+import argparse
+import csv
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NEW_ORDER = '🛒 طلبية جديدة'
+
+
+def write_catalog(path, rows, seed):
+    sys.path.insert(0, REPO_DIR)
+    from catalog import REQUIRED_COLUMNS
+    from catalog_memory import synthetic_rows
+
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(REQUIRED_COLUMNS)
+        writer.writerows(synthetic_rows(rows, seed=seed))
+
+
+def _stage_seconds(stage):
+    """Total seconds recorded for stage so far, if the app under test has the metrics module"""
+    metrics = sys.modules.get('metrics')
+    if metrics is None or not hasattr(metrics, 'REGISTRY'):
+        return None
+    return metrics.REGISTRY.histogram(stage).sum
+
+
+def measure(app_path, catalog_path, clicks):
+    """Time clicks ➕ clicks on the first page of app_path; runs in its own process"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(app_path)))
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(app_path, default_timeout=600)
+    app.secrets.update({
+        'catalog': {'source': 'csv', 'path': catalog_path, 'refresh_seconds': 0, 'snapshot_path': ''},
+        'metrics': {'path': ''},
+        'whatsapp': {'number': '201234567890'},
+    })
+    app.run()
+    next(button for button in app.button if button.label == NEW_ORDER).click().run()
+    keys = [button.key for button in app.button if (button.key or '').startswith('plus_')]
+
+    click_seconds = []
+    fragment_seconds = []
+    for k in range(clicks):
+        fragment_before = _stage_seconds('order_area')
+        start = time.perf_counter()
+        app.button(key=keys[k % len(keys)]).click().run()
+        click_seconds.append(time.perf_counter() - start)
+        if app.exception:
+            raise RuntimeError(f"app raised: {app.exception[0].value}")
+        if fragment_before is not None:
+            fragment_seconds.append(_stage_seconds('order_area') - fragment_before)
+
+    return {
+        'app': app_path,
+        'apptest_click_ms': statistics.median(click_seconds) * 1000,
+        'fragment_ms': statistics.median(fragment_seconds) * 1000 if fragment_seconds else None,
+    }
+
+
+def run_measurement(app_path, catalog_path, clicks):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--measure', app_path, '--catalog', catalog_path,
+         '--clicks', str(clicks)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--clicks', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--before', help='app.py of a checkout from before the order-area fragment')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--catalog', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.catalog, args.clicks)))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        catalog_path = os.path.join(directory, 'catalog.csv')
+        write_catalog(catalog_path, args.rows, args.seed)
+        apps = ([('before', args.before)] if args.before else []) + [('after', os.path.join(REPO_DIR, 'app.py'))]
+        print(f"{args.rows} rows, median of {args.clicks} ➕ clicks")
+        print(f"{'':>7} {'AppTest click':>14} {'server per click':>17}")
+        for label, app_path in apps:
+            result = run_measurement(app_path, catalog_path, args.clicks)
+            # Before the fragment the click's full runs were the server's work; now it is one fragment run
+            server = result['fragment_ms'] if result['fragment_ms'] is not None else result['apptest_click_ms']
+            print(f"{label:>7} {result['apptest_click_ms']:>12.1f}ms {server:>15.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
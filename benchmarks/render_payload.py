@@ -0,0 +1,71 @@
+"""Elements and bytes the app emits per rerun, per product table mode
+
+Runs app.py headless through Streamlit's AppTest against a synthetic CSV
+catalog, opens a new order, and reports for each [ui] table_mode how many
+elements the rerun produced and the serialized size of their protos.
+Needs streamlit installed. Run from the repository root:
+
+    python benchmarks/render_payload.py --rows 10000
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from catalog import REQUIRED_COLUMNS  # noqa: E402
+from catalog_memory import synthetic_rows  # noqa: E402
+
+
+def write_catalog(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(REQUIRED_COLUMNS)
+        writer.writerows(rows)
+
+
+def walk(node):
+    """Every element under an AppTest node, skipping the layout blocks"""
+    children = getattr(node, 'children', None)
+    if children is None:
+        yield node
+        return
+    for child in children.values():
+        yield from walk(child)
+
+
+def measure(catalog_path, table_mode):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=120)
+    at.secrets['catalog'] = {'source': 'csv', 'path': catalog_path, 'refresh_seconds': 0, 'snapshot_path': ''}
+    at.secrets['whatsapp'] = {'number': '200000000000'}
+    at.secrets['ui'] = {'table_mode': table_mode}
+    at.run()
+    # "طلبية جديدة" is the first button on the page
+    at.button[0].click().run()
+
+    elements = list(walk(at._tree))
+    payload = sum(element.proto.ByteSize() for element in elements if getattr(element, 'proto', None) is not None)
+    return {'mode': table_mode, 'elements': len(elements), 'payload_bytes': payload}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog_path = os.path.join(tmp, 'catalog.csv')
+        write_catalog(catalog_path, synthetic_rows(args.rows))
+        results = [measure(catalog_path, mode) for mode in ('widgets', 'html')]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
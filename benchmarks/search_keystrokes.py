@@ -0,0 +1,145 @@
+"""Server work per search keystroke: server-side search versus the client-side catalog
+
+Runs app.py headless through Streamlit's AppTest against a synthetic CSV
+catalog, once per [ui] search_mode, and reads the server's own time for
+every rerun from the stage timings in metrics.py:
+
+- server mode: every keystroke reruns the script (the `rerun` stage); once
+  with exact search and once with fuzzy ranking on. A ➕ click then reruns
+  the order area fragment (`order_area`).
+- client mode: keystrokes are handled in the browser and send nothing, so
+  no rerun happens while typing. The server works once per catalog version,
+  building the compressed catalog and sending it in the rerun the browser
+  asks for it in, and on every cart change, which reruns the catalog
+  fragment (`client_catalog`).
+
+AppTest replays a fragment rerun as a full script run, so fragment costs
+are read from their own stage, not from `rerun`. Browser events are fed to
+the components the way the browser sends them, as the component's widget
+value. Run from the repository root:
+
+    python benchmarks/search_keystrokes.py --rows 10000 100000
+"""
+import argparse
+import csv
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from catalog import REQUIRED_COLUMNS, build_catalog  # noqa: E402
+from catalog_memory import synthetic_rows  # noqa: E402
+from metrics import REGISTRY  # noqa: E402
+from rendering import client_catalog_payload  # noqa: E402
+
+# What a customer types, one keystroke at a time
+QUERIES = ['فلتر زيت لانسر', 'تيل امامي فيرنا', 'بوجيه 12']
+NEW_ORDER = '🛒 طلبية جديدة'
+FUZZY_LABEL = '🔤 بحث ذكي'
+
+
+def keystrokes(query):
+    return [query[:i] for i in range(1, len(query) + 1)]
+
+
+def write_catalog(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(REQUIRED_COLUMNS)
+        writer.writerows(synthetic_rows(rows))
+
+
+def stage_seconds(stage):
+    return REGISTRY.histogram(stage).sum
+
+
+def timed_run(run, stage):
+    """Seconds the stage recorded during run()"""
+    before = stage_seconds(stage)
+    app = run()
+    if app.exception:
+        raise RuntimeError(f"app raised: {app.exception[0].value}")
+    return stage_seconds(stage) - before
+
+
+def open_app(catalog_path, search_mode):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=120)
+    app.secrets['catalog'] = {'source': 'csv', 'path': catalog_path, 'refresh_seconds': 0, 'snapshot_path': ''}
+    app.secrets['whatsapp'] = {'number': '200000000000'}
+    app.secrets['metrics'] = {'path': ''}
+    app.secrets['ui'] = {'table_mode': 'widgets', 'search_mode': search_mode}
+    app.run()
+    next(button for button in app.button if button.label == NEW_ORDER).click().run()
+    return app
+
+
+def send_component_event(app, event):
+    """Run the app with event as the first component's value, like the browser reporting it"""
+    component = app.get('component_instance')[0]
+    arguments = json.loads(component.proto.json_args)
+    states = app._tree.get_widget_states()
+    state = states.widgets.add()
+    state.id = component.proto.id
+    state.json_value = json.dumps({**event, 'etag': arguments['etag']})
+    return app._run(states)
+
+
+def server_mode(catalog_path, fuzzy):
+    app = open_app(catalog_path, 'server')
+    if fuzzy:
+        next(box for box in app.checkbox if box.label.startswith(FUZZY_LABEL)).check().run()
+    typed = [prefix for query in QUERIES for prefix in keystrokes(query)]
+    keystroke = [timed_run(app.text_input[0].set_value(prefix).run, 'rerun') for prefix in typed]
+    plus = next(button for button in app.button if (button.key or '').startswith('plus_'))
+    cart_change = timed_run(app.button(key=plus.key).click().run, 'order_area')
+    return statistics.median(keystroke), cart_change
+
+
+def client_mode(catalog_path):
+    app = open_app(catalog_path, 'client')
+    payload = timed_run(lambda: send_component_event(app, {'nonce': 'need', 'type': 'need'}), 'rerun')
+    changes = [timed_run(lambda: send_component_event(app, {'nonce': f'plus-{k}', 'type': 'quantity',
+                                                            'gid': k, 'change': 1}), 'client_catalog')
+               for k in range(5)]
+    return payload, statistics.median(changes)
+
+
+def payload_build(rows):
+    """Seconds and bytes of the compressed catalog, built once per catalog version"""
+    catalog = build_catalog(REQUIRED_COLUMNS, synthetic_rows(rows))
+    start = time.perf_counter()
+    _, payload = client_catalog_payload(catalog)
+    return time.perf_counter() - start, len(payload)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args(argv)
+
+    print("server time per event, from the app's stage timings (median)")
+    print(f"{'rows':>8} | {'server mode: keystroke':>22} {'fuzzy keystroke':>16} {'cart change':>12} | "
+          f"{'client mode: keystroke':>22} {'catalog build':>14} {'catalog send':>13} {'cart change':>12}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            catalog_path = os.path.join(directory, 'catalog.csv')
+            write_catalog(catalog_path, rows)
+            exact, server_change = server_mode(catalog_path, fuzzy=False)
+            fuzzy, _ = server_mode(catalog_path, fuzzy=True)
+            payload, client_change = client_mode(catalog_path)
+        build, size = payload_build(rows)
+        print(f"{rows:>8} | {exact * 1000:>20.1f}ms {fuzzy * 1000:>14.1f}ms {server_change * 1000:>10.1f}ms | "
+              f"{'no rerun':>22} {build * 1000:>5.0f}ms {size / 1024:>4.0f}KB {payload * 1000:>11.1f}ms "
+              f"{client_change * 1000:>10.1f}ms", flush=True)
+
+
+if __name__ == '__main__':
+    main()
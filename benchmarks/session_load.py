@@ -0,0 +1,272 @@
+"""Concurrent customer sessions driven through app.py with Streamlit's headless AppTest
+
+Every simulated session is an AppTest of app.py against a local CSV catalog.
+It opens a new order, searches, picks an origin and then changes it, pages
+forward, adds and removes items and checks that the WhatsApp link is there,
+timing every rerun.
+
+AppTest swaps process-wide state (the runtime instance, st.secrets, config
+options) in and out around every run, so two of its runs cannot overlap in
+one process. By default (--mode processes) each of the N sessions therefore
+runs in its own process, forked once the catalog is loaded, and the N
+sessions really compete for the machine's cores: throughput levels off and
+latency climbs where the box saturates. Each process has its own copy of
+the listing cache, where a real server shares one between its sessions.
+
+--mode threads runs the N sessions on threads of this one process instead,
+sharing the catalog store and listing cache as a server's sessions do, but
+taking turns for every rerun. Its latencies are queue-simulated: they grow
+with the queue, not with real contention, and the output says so.
+
+For every N it reports throughput (reruns per second across all sessions),
+p50/p95/p99 rerun latency, and memory: the private memory of each session
+process, or the resident memory each thread session added. Needs streamlit
+installed; run from the repository root:
+
+    python benchmarks/session_load.py --sessions 1 2 4 8 --rows 10000 --output load.json
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from catalog import REQUIRED_COLUMNS  # noqa: E402
+from catalog_memory import ORIGINS, synthetic_rows  # noqa: E402
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+QUERIES = ['فلتر زيت', 'تيل امامي', 'بوجيه', 'مساعد لانسر', 'سير مكينة']
+NEW_ORDER = '🛒 طلبية جديدة'
+NEXT_PAGE = 'التالية ➡️'
+RERUN_TIMEOUT_SECONDS = 120
+# One AppTest run at a time in a process, see the module docstring
+RUN_LOCK = threading.Lock()
+MODES = ('processes', 'threads')
+
+
+def write_catalog(path, rows, seed):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(REQUIRED_COLUMNS)
+        writer.writerows(synthetic_rows(rows, seed=seed))
+
+
+def rss_bytes():
+    """Current resident set size; peak RSS where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def private_bytes():
+    """Memory only this process uses (not pages shared with its parent); resident size where unknown"""
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return sum(int(fields[name].split()[0]) for name in ('Private_Clean', 'Private_Dirty')) * 1024
+    except (OSError, KeyError, ValueError):
+        return rss_bytes()
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+class Session:
+    """One simulated customer: an AppTest plus the latency of every rerun it caused"""
+
+    def __init__(self, secrets, seed):
+        self.app = AppTest.from_file(APP_PATH, default_timeout=RERUN_TIMEOUT_SECONDS)
+        self.app.secrets.update(secrets)
+        self.rng = random.Random(seed)
+        self.latencies = []
+        self.whatsapp_link = False
+
+    def run(self, widget=None):
+        start = time.perf_counter()
+        with RUN_LOCK:
+            (widget or self.app).run()
+        self.latencies.append(time.perf_counter() - start)
+        if self.app.exception:
+            raise RuntimeError(f"app raised: {self.app.exception[0].value}")
+
+    def button(self, label):
+        return next((b for b in self.app.button if b.label == label), None)
+
+    def product_buttons(self, prefix):
+        return [b for b in self.app.button if (b.key or '').startswith(prefix)]
+
+    def scenario(self):
+        self.run()
+        self.run(self.button(NEW_ORDER).click())
+        self.run(self.app.text_input[0].input(self.rng.choice(QUERIES)))
+
+        # The option labels carry live counts, so the selection is set by value through session state
+        first, second = self.rng.sample(ORIGINS, 2)
+        self.app.session_state['origin_facets'] = [first]
+        self.run()
+        self.app.session_state['origin_facets'] = [second]
+        self.run()
+
+        for _ in range(2):
+            next_page = self.button(NEXT_PAGE)
+            if next_page is None or next_page.disabled:
+                break
+            self.run(next_page.click())
+
+        pluses = self.product_buttons('plus_')
+        for button in self.rng.sample(pluses, min(3, len(pluses))):
+            self.run(self.app.button(key=button.key).click())
+        if pluses:
+            # A second of the same item, then take one away again
+            key = pluses[0].key
+            self.run(self.app.button(key=key).click())
+            self.run(self.app.button(key='minus_' + key[len('plus_'):]).click())
+
+        self.whatsapp_link = any('https://wa.me/' in element.value for element in self.app.markdown)
+
+
+def summarize(count, latencies, elapsed, memory_per_session, links):
+    latencies = sorted(latencies)
+    return {
+        'sessions': count,
+        'reruns': len(latencies),
+        'seconds': elapsed,
+        'reruns_per_second': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        'memory_per_session_kb': memory_per_session / 1024,
+        'whatsapp_links': links,
+    }
+
+
+def run_threads(count, secrets, seed):
+    """Run count sessions on threads of this process, one rerun at a time"""
+    before = rss_bytes()
+    sessions = [Session(secrets, seed + i) for i in range(count)]
+    start_together = threading.Barrier(count)
+
+    def drive(session):
+        start_together.wait()
+        session.scenario()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        for future in [pool.submit(drive, session) for session in sessions]:
+            future.result()
+    elapsed = time.perf_counter() - start
+    # Sessions are kept alive until here, so this is what their state and widgets hold
+    added = max(rss_bytes() - before, 0) / count
+    return summarize(count, [latency for session in sessions for latency in session.latencies], elapsed,
+                     added, sum(session.whatsapp_link for session in sessions))
+
+
+def _process_session(secrets, seed, start_together, results):
+    session = Session(secrets, seed)
+    try:
+        start_together.wait()
+        started = time.time()
+        session.scenario()
+        results.put({'started': started, 'finished': time.time(), 'latencies': session.latencies,
+                     'private': private_bytes(), 'link': session.whatsapp_link})
+    except Exception as error:
+        results.put({'error': repr(error)})
+
+
+def run_processes(count, secrets, seed):
+    """Run count sessions at once, each in its own process forked from this warmed-up one"""
+    context = multiprocessing.get_context('fork')
+    start_together = context.Barrier(count)
+    results = context.Queue()
+    processes = [context.Process(target=_process_session, args=(secrets, seed + i, start_together, results))
+                 for i in range(count)]
+    for process in processes:
+        process.start()
+    outcomes = [results.get(timeout=RERUN_TIMEOUT_SECONDS * 20) for _ in processes]
+    for process in processes:
+        process.join()
+    errors = [outcome['error'] for outcome in outcomes if 'error' in outcome]
+    if errors:
+        raise RuntimeError(f"session failed: {errors[0]}")
+
+    elapsed = max(outcome['finished'] for outcome in outcomes) - min(outcome['started'] for outcome in outcomes)
+    return summarize(count, [latency for outcome in outcomes for latency in outcome['latencies']], elapsed,
+                     statistics.fmean(outcome['private'] for outcome in outcomes),
+                     sum(outcome['link'] for outcome in outcomes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 4, 16, 32])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--mode', choices=MODES, default='processes',
+                        help='one process per session (real contention) or threads taking turns (queue-simulated)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        catalog_path = os.path.join(directory, 'catalog.csv')
+        write_catalog(catalog_path, args.rows, args.seed)
+        secrets = {
+            # No background refresh or snapshot, so every level sees the same catalog and no disk writes
+            'catalog': {'source': 'csv', 'path': catalog_path, 'refresh_seconds': 0, 'snapshot_path': ''},
+            # The widget table, since AppTest cannot click inside the table components
+            'ui': {'table_mode': 'widgets', 'search_mode': 'server'},
+            'metrics': {'path': ''},
+            'whatsapp': {'number': '201234567890'},
+        }
+
+        # Load the catalog and build its indexes once, outside the measured levels; forked sessions inherit them
+        warm = Session(secrets, args.seed)
+        start = time.perf_counter()
+        warm.run()
+        warm.run(warm.button(NEW_ORDER).click())
+        cold_seconds = time.perf_counter() - start
+
+        print(f'cold start with {args.rows} rows: {cold_seconds:.2f}s; {os.cpu_count()} CPUs')
+        if args.mode == 'threads':
+            print('threads: one rerun at a time, latencies are queue-simulated, not measured under contention')
+            memory_label = 'KB added/session'
+        else:
+            print('processes: one process per session, competing for the CPUs')
+            memory_label = 'KB private/session'
+        print(f"{'sessions':>8} {'reruns/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {memory_label:>19} {'links':>6}")
+        run_level = run_threads if args.mode == 'threads' else run_processes
+        levels = []
+        for count in args.sessions:
+            level = run_level(count, secrets, args.seed)
+            levels.append(level)
+            print(f"{count:>8} {level['reruns_per_second']:>9.1f} {level['p50_ms']:>7.1f}ms "
+                  f"{level['p95_ms']:>7.1f}ms {level['p99_ms']:>7.1f}ms {level['memory_per_session_kb']:>19.0f} "
+                  f"{level['whatsapp_links']:>3}/{count}", flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'rows': args.rows, 'mode': args.mode, 'cpus': os.cpu_count(), 'cold_seconds': cold_seconds,
+                       'levels': levels}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
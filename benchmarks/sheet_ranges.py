@@ -0,0 +1,57 @@
+"""Google Sheets transfer: whole worksheet versus only the required columns
+
+Runs GoogleSheetSource against the stand-in worksheet from
+tests/test_catalog_sources.py, which records every range requested and the
+JSON bytes it would return. The sheet gets the office's extra columns
+(notes, supplier, stock), which the old get_all_values() download carried
+along. The tests check the ranges, the parse and moved columns; this
+measures the transfer and parse time at catalog sizes.
+The parse columns time includes rebuilding rows from the column ranges;
+parse all is build_catalog alone, since gspread builds those rows itself.
+
+Run from the repository root:
+
+    python benchmarks/sheet_ranges.py 10000 100000
+"""
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'tests'))
+
+from catalog import build_catalog  # noqa: E402
+from catalog_memory import synthetic_rows  # noqa: E402
+from test_catalog_sources import RecordingWorksheet, StandInSheetSource, office_sheet  # noqa: E402
+
+
+def main(sizes):
+    print(f"{'rows':>8} {'all values':>12} {'columns':>10} {'saved':>7} {'parse all':>10} {'parse columns':>14}")
+    for size in sizes:
+        grid = office_sheet(synthetic_rows(size))
+
+        full = RecordingWorksheet(grid)
+        all_values = full.get_all_values()
+        start = time.perf_counter()
+        build_catalog(all_values[0], all_values[1:])
+        parse_all = time.perf_counter() - start
+
+        sheet = RecordingWorksheet(grid)
+        source = StandInSheetSource(sheet)
+        source.fetch()  # first fetch resolves the columns from the header row
+        sheet.requests.clear()
+        sheet.bytes_sent = 0
+        sheet.serve_seconds = 0.0
+        start = time.perf_counter()
+        headers, rows = source.fetch()
+        build_catalog(headers, rows)
+        parse_columns = time.perf_counter() - start - sheet.serve_seconds
+
+        print(f"{size:>8} {full.bytes_sent / 2**20:>10.2f}MB {sheet.bytes_sent / 2**20:>8.2f}MB "
+              f"{1 - sheet.bytes_sent / full.bytes_sent:>6.0%} {parse_all:>9.3f}s {parse_columns:>13.3f}s")
+    print(f"ranges per refresh: {sheet.requests[0]}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
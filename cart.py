@@ -0,0 +1,108 @@
+"""Shopping cart keyed by product id with running totals
+
+Lines are keyed by the product's global_id, so rows that share a name but
+differ in origin or price stay separate. Every change updates the item and
+cost totals in place, so reading them is O(1). Prices are taken from the
+catalog when a line is added and only change through reprice(), which the
+app calls once per catalog version and which follows every line to its row
+by the row's ProductKey.
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from catalog import Catalog, ProductKey
+
+
+class CartLine:
+    """One product in the cart"""
+
+    __slots__ = ('product_id', 'key', 'name', 'origin', 'price', 'quantity')
+
+    def __init__(self, product_id: int, key: ProductKey, name: str, origin: str, price: float, quantity: int = 0):
+        self.product_id = product_id
+        self.key = key
+        self.name = name
+        self.origin = origin
+        self.price = price
+        self.quantity = quantity
+
+    @property
+    def subtotal(self) -> float:
+        return self.quantity * self.price
+
+
+class Cart:
+    """Cart lines by product id plus running item and cost totals"""
+
+    __slots__ = ('lines', 'total_items', 'total_cost', 'catalog_version')
+
+    def __init__(self, catalog_version: Optional[int] = None):
+        self.lines: Dict[int, CartLine] = {}
+        self.total_items = 0
+        self.total_cost = 0.0
+        self.catalog_version = catalog_version
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def __bool__(self) -> bool:
+        return bool(self.lines)
+
+    def __iter__(self) -> Iterator[CartLine]:
+        return iter(self.lines.values())
+
+    def quantity(self, product_id: int) -> int:
+        line = self.lines.get(product_id)
+        return line.quantity if line is not None else 0
+
+    def change(self, catalog: Catalog, product_id: int, change: int) -> int:
+        """Add change to a product's quantity (never below zero); returns the new quantity"""
+        line = self.lines.get(product_id)
+        if line is None:
+            if change <= 0:
+                return 0
+            line = self.lines[product_id] = CartLine(
+                product_id, catalog.key(product_id), catalog.names[product_id], catalog.origin(product_id),
+                catalog.prices[product_id],
+            )
+
+        new_quantity = max(0, line.quantity + change)
+        delta = new_quantity - line.quantity
+        line.quantity = new_quantity
+        self.total_items += delta
+        self.total_cost += delta * line.price
+
+        if new_quantity == 0:
+            del self.lines[product_id]
+        return new_quantity
+
+    def reprice(self, catalog: Catalog, catalog_version: int) -> Tuple[List[Tuple[CartLine, float]], List[CartLine]]:
+        """Move every line onto a new catalog version
+
+        Lines are matched by their product key, since a refresh may move
+        rows, and take the new id and price with the totals adjusted. Keys
+        are unique, so two lines never land on the same product. Returns
+        (repriced, removed): (line, old_price) for every line whose price
+        changed, and the lines dropped because their product is gone.
+        """
+        repriced = []
+        removed = []
+        lines = {}
+        for line in self.lines.values():
+            product_id = catalog.find(line.key)
+            if product_id is None:
+                removed.append(line)
+                self.total_items -= line.quantity
+                self.total_cost -= line.subtotal
+                continue
+
+            old_price = line.price
+            line.product_id = product_id
+            line.price = catalog.prices[product_id]
+            if line.price != old_price:
+                self.total_cost += line.quantity * (line.price - old_price)
+                repriced.append((line, old_price))
+            lines[product_id] = line
+
+        self.lines = lines
+        self.catalog_version = catalog_version
+        return repriced, removed
@@ -0,0 +1,374 @@
+"""Columnar product catalog built from raw sheet rows
+
+The catalog keeps one column per field instead of one dict per row:
+categorical codes for category and origin, a float price array, a tuple of
+product names, and the positions of the blank separator rows. It is built
+once per load and shared read-only by every session.
+
+Parsing works column by column: every distinct price string is normalized
+once (Arabic-Indic digits, thousands separators, currency suffixes), and
+rows that cannot be sold are rejected into a ValidationReport instead of
+silently showing up with a price of zero.
+"""
+import math
+import re
+import threading
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Columns every catalog source must provide
+REQUIRED_COLUMNS = ['الفئة', 'البند', 'المنشأ', 'السعر']
+
+# (category, name, origin, occurrence): identifies one row across catalog versions. occurrence
+# numbers rows that share category, name and origin in sheet order, so duplicates stay apart
+ProductKey = Tuple[str, str, str, int]
+
+# Layout entries that are not product indices
+SUB_CATEGORY_SEPARATOR = -1
+CATEGORY_SEPARATOR = -2
+
+
+def _column(values) -> memoryview:
+    """Read-only view over a numeric buffer (array, mmap slice, shared memory)"""
+    return memoryview(values).toreadonly()
+
+
+class StringColumn:
+    """Read-only text column over uint32 offsets into a UTF-8 blob, decoded one value at a time
+
+    Lets a catalog use names that stay in a shared memory map instead of
+    holding a str per product in every process. blob is anything sliceable
+    to bytes, such as an mmap; values start at base.
+    """
+
+    __slots__ = ('offsets', 'blob', 'base')
+
+    def __init__(self, offsets, blob, base: int = 0):
+        self.offsets = offsets
+        self.blob = blob
+        self.base = base
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('StringColumn index out of range')
+        base = self.base
+        return self.blob[base + self.offsets[index]:base + self.offsets[index + 1]].decode('utf-8')
+
+    def __iter__(self):
+        blob = self.blob
+        base = self.base
+        offsets = self.offsets
+        start = offsets[0]
+        for k in range(1, len(offsets)):
+            end = offsets[k]
+            yield blob[base + start:base + end].decode('utf-8')
+            start = end
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (StringColumn, tuple, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+
+def codes_typecode(category_count: int) -> str:
+    """Smallest unsigned array typecode that can hold the category codes"""
+    return 'H' if category_count <= 0xFFFF else 'I'
+
+
+class Catalog:
+    """Immutable columnar catalog; product i is row i of every column
+
+    separators holds, for every blank sheet row, the index of the product it
+    precedes (len(catalog) for trailing blank rows), in sheet order.
+    """
+
+    __slots__ = ('names', 'prices', 'category_codes', 'categories',
+                 'origin_codes', 'origins', 'separators', 'validation', '_derived', '_derived_lock')
+
+    def __init__(self, names: Sequence[str], prices, category_codes, categories: Sequence[str],
+                 origin_codes, origins: Sequence[str], separators):
+        # A StringColumn is kept as it is, so shared names are not decoded up front
+        self.names = names if isinstance(names, StringColumn) else tuple(names)
+        self.prices = _column(prices)
+        self.category_codes = _column(category_codes)
+        self.categories = tuple(categories)
+        self.origin_codes = _column(origin_codes)
+        self.origins = tuple(origins)
+        self.separators = _column(separators)
+        # The ValidationReport of the load that built this catalog, None for restored snapshots
+        self.validation: Optional['ValidationReport'] = None
+        self._derived: Dict[str, Any] = {}
+        self._derived_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def category(self, index: int) -> str:
+        return self.categories[self.category_codes[index]]
+
+    def origin(self, index: int) -> str:
+        return self.origins[self.origin_codes[index]]
+
+    def key(self, index: int) -> ProductKey:
+        """The product's key, which finds the same row in another version"""
+        return _product_keys(self)[0][index]
+
+    def find(self, key: ProductKey) -> Optional[int]:
+        """Index of the product with this key, or None"""
+        return product_keys(self).get(key)
+
+    def derived(self, name: str, build: Callable[['Catalog'], Any]) -> Any:
+        """Structure computed from this catalog once and reused by every session
+
+        Indexes live and die with the catalog version they were built from.
+        """
+        value = self._derived.get(name)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(name)
+                if value is None:
+                    value = self._derived[name] = build(self)
+        return value
+
+    def cached(self, name: str) -> Optional[Any]:
+        """The derived structure if it was built already, without building it"""
+        return self._derived.get(name)
+
+    def inherit(self, name: str, value: Any):
+        """Adopt a derived structure from another version whose inputs are unchanged"""
+        with self._derived_lock:
+            self._derived.setdefault(name, value)
+
+
+def _build_product_keys(catalog: Catalog) -> Tuple[List[ProductKey], Dict[ProductKey, int]]:
+    keys = []
+    index_of = {}
+    occurrences: Dict[Tuple[str, str, str], int] = {}
+    categories = catalog.categories
+    category_codes = catalog.category_codes
+    origins = catalog.origins
+    origin_codes = catalog.origin_codes
+    for index, name in enumerate(catalog.names):
+        row = (categories[category_codes[index]], name, origins[origin_codes[index]])
+        occurrence = occurrences.get(row, 0)
+        occurrences[row] = occurrence + 1
+        key = row + (occurrence,)
+        keys.append(key)
+        index_of[key] = index
+    return keys, index_of
+
+
+def _product_keys(catalog: Catalog) -> Tuple[List[ProductKey], Dict[ProductKey, int]]:
+    """(key of every product, product index of every key), built once per catalog version"""
+    return catalog.derived('product_keys', _build_product_keys)
+
+
+def product_keys(catalog: Catalog) -> Dict[ProductKey, int]:
+    """Product key -> product index, built once per catalog version"""
+    return _product_keys(catalog)[1]
+
+
+def _encode_column(values: Sequence[str]) -> Tuple[array, List[str]]:
+    """Dense codes for a text column, numbered in order of first appearance"""
+    distinct = list(dict.fromkeys(values))
+    code_of = {value: code for code, value in enumerate(distinct)}
+    return array(codes_typecode(len(distinct)), map(code_of.__getitem__, values)), distinct
+
+
+# Arabic-Indic and Persian digits, the Arabic decimal and thousands separators, and spaces
+_PRICE_TRANSLATION = {0x0660 + d: str(d) for d in range(10)}
+_PRICE_TRANSLATION.update({0x06F0 + d: str(d) for d in range(10)})
+_PRICE_TRANSLATION.update({ord('٫'): '.', ord('٬'): None, ord(' '): None, 0xA0: None, 0x202F: None})
+_CURRENCY = re.compile(r'ج\.?\s*م\.?|جنيه(?:ا|ات)?|egp|l\.?e\.?', re.IGNORECASE)
+_GROUPED_THOUSANDS = re.compile(r'^[+-]?\d{1,3}(?:,\d{3})+(?:\.\d+)?$')
+
+# Reasons recorded in a ValidationReport
+MISSING_NAME = 'missing name'
+MISSING_PRICE = 'missing price'
+INVALID_PRICE = 'invalid price'
+NEGATIVE_PRICE = 'negative price'
+NORMALIZED_PRICE = 'price normalized'
+# Rows listed per reason; beyond this only the count grows
+MAX_REPORTED_ROWS = 200
+
+
+def normalize_price(value) -> Tuple[Optional[float], bool]:
+    """(price, coerced) for a price cell; price is None when it cannot be read
+
+    Plain numbers pass straight through float(). Anything else is retried
+    with Arabic-Indic digits, thousands separators and currency such as
+    "ج.م" normalized away, and reported as coerced when that succeeds.
+    """
+    text = str(value).strip()
+    try:
+        price = float(text)
+        return (price, False) if math.isfinite(price) else (None, False)
+    except ValueError:
+        pass
+
+    cleaned = _CURRENCY.sub('', text.translate(_PRICE_TRANSLATION))
+    if _GROUPED_THOUSANDS.match(cleaned):
+        cleaned = cleaned.replace(',', '')
+    elif cleaned.count(',') == 1 and '.' not in cleaned:
+        # A lone comma is a decimal comma: "12,5"
+        cleaned = cleaned.replace(',', '.')
+    try:
+        price = float(cleaned)
+    except ValueError:
+        return None, False
+    return (price, True) if math.isfinite(price) else (None, False)
+
+
+class ValidationReport:
+    """Rows one load rejected or coerced, by reason, with sheet row numbers
+
+    Row numbers count the header as row 1, so they match what the office
+    sees in the sheet. Each reason keeps its total count and the first
+    MAX_REPORTED_ROWS (row number, cell value) pairs.
+    """
+
+    __slots__ = ('rows', 'products', 'rejected', 'coerced', 'counts', 'examples')
+
+    def __init__(self):
+        self.rows = 0
+        self.products = 0
+        self.rejected = 0
+        self.coerced = 0
+        self.counts: Dict[str, int] = {}
+        self.examples: Dict[str, List[Tuple[int, str]]] = {}
+
+    def add(self, reason: str, row_number: int, value: str, rejected: bool):
+        if rejected:
+            self.rejected += 1
+        else:
+            self.coerced += 1
+        self.counts[reason] = self.counts.get(reason, 0) + 1
+        examples = self.examples.setdefault(reason, [])
+        if len(examples) < MAX_REPORTED_ROWS:
+            examples.append((row_number, value))
+
+    def __bool__(self) -> bool:
+        return bool(self.counts)
+
+    def merge(self, label: str, other: 'ValidationReport'):
+        """Fold another source's report into this one, its reasons prefixed with label"""
+        self.rows += other.rows
+        self.products += other.products
+        self.rejected += other.rejected
+        self.coerced += other.coerced
+        for reason, count in other.counts.items():
+            key = f"{label}: {reason}" if label else reason
+            self.counts[key] = self.counts.get(key, 0) + count
+            examples = self.examples.setdefault(key, [])
+            examples.extend(other.examples[reason][:MAX_REPORTED_ROWS - len(examples)])
+
+    def summary(self) -> str:
+        parts = [f"{self.products} products from {self.rows} rows"]
+        parts.extend(f"{reason}: {count}" for reason, count in self.counts.items())
+        return ', '.join(parts)
+
+
+def _price_table(values: Iterable[str]) -> Dict[str, Tuple[Optional[float], bool]]:
+    """normalize_price for every distinct value; sheets repeat the same prices a lot"""
+    return {value: normalize_price(value) for value in set(values)}
+
+
+def build_catalog(headers: Sequence[str], rows: Sequence[Sequence[str]],
+                  report: Optional[ValidationReport] = None) -> Catalog:
+    """Build the catalog from a header row and data rows
+
+    Blank rows become sub-category separators, every other row becomes a
+    product whose index is its global_id. Rows without a name or a readable,
+    non-negative price are rejected. Rejected and coerced rows are recorded
+    in report (a new one if not given), which is attached to the catalog as
+    catalog.validation. Raises ValueError when a required column is missing.
+    """
+    headers = [str(header).strip() for header in headers]
+    for col in REQUIRED_COLUMNS:
+        if col not in headers:
+            raise ValueError(f"Missing required column: {col}")
+    category_at, name_at, origin_at, price_at = (headers.index(col) for col in REQUIRED_COLUMNS)
+    needed = max(category_at, name_at, origin_at, price_at) + 1
+    report = report if report is not None else ValidationReport()
+    report.rows = len(rows)
+
+    # Local sources may return ragged rows, pad them so every required column exists
+    rows = [row if len(row) >= needed else list(row) + [''] * (needed - len(row)) for row in rows]
+    # Whole columns at once; a blank row is one whose cells join to whitespace
+    blank = [not ''.join(row).strip() for row in rows]
+    name_column = [row[name_at] for row in rows]
+    price_column = [row[price_at] for row in rows]
+    prices_by_text = _price_table(price_column)
+
+    names = []
+    prices = array('d')
+    kept = []
+    separators = array('I')
+    for k, is_blank in enumerate(blank):
+        if is_blank:
+            separators.append(len(names))
+            continue
+
+        row_number = k + 2
+        name = name_column[k]
+        if not name.strip():
+            report.add(MISSING_NAME, row_number, name, rejected=True)
+            continue
+        text = price_column[k]
+        price, coerced = prices_by_text[text]
+        if price is None:
+            report.add(MISSING_PRICE if not str(text).strip() else INVALID_PRICE, row_number, text, rejected=True)
+            continue
+        if price < 0:
+            report.add(NEGATIVE_PRICE, row_number, text, rejected=True)
+            continue
+        if coerced:
+            report.add(NORMALIZED_PRICE, row_number, text, rejected=False)
+
+        names.append(name)
+        prices.append(price)
+        kept.append(k)
+
+    category_codes, categories = _encode_column([rows[k][category_at] for k in kept])
+    origin_codes, origins = _encode_column([rows[k][origin_at] for k in kept])
+    report.products = len(names)
+
+    catalog = Catalog(names, prices, category_codes, categories, origin_codes, origins, separators)
+    catalog.validation = report
+    return catalog
+
+
+def group_products_by_category(catalog: Catalog, product_indices: Iterable[int]) -> List[int]:
+    """Lay out products in sheet order with category and sub-category separators
+
+    Returns a list of product indices interleaved with CATEGORY_SEPARATOR
+    (where the category changes) and SUB_CATEGORY_SEPARATOR (the sheet's
+    blank rows, which are always kept).
+    """
+    layout = []
+    separators = catalog.separators
+    category_codes = catalog.category_codes
+    j = 0
+    current_category = None
+
+    for i in product_indices:
+        while j < len(separators) and separators[j] <= i:
+            layout.append(SUB_CATEGORY_SEPARATOR)
+            j += 1
+        category = category_codes[i]
+        if current_category is not None and category != current_category:
+            layout.append(CATEGORY_SEPARATOR)
+        layout.append(i)
+        current_category = category
+
+    layout.extend([SUB_CATEGORY_SEPARATOR] * (len(separators) - j))
+    return layout
@@ -0,0 +1,102 @@
+"""Row-level differences between two catalog versions, and index reuse across them
+
+A refresh still parses the whole sheet, which is cheap, but the derived
+indexes are not rebuilt blindly. Every index declares the catalog columns
+it is built from; when those columns are unchanged the new version adopts
+the old index as-is, and a catalog that only grew at the end extends the
+old search index instead of rebuilding it. A price-only edit in the sheet
+therefore rebuilds just the price sort orders and the browser payload.
+
+Products are matched across versions by their ProductKey, the same key
+the cart uses to follow its lines onto a new version, so rows that share a
+name and origin are diffed one by one.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+from catalog import Catalog, ProductKey, product_keys
+from sorting import SORT_CATEGORY, SORT_NAME, SORT_PRICE_ASC, SORT_PRICE_DESC
+
+COLUMNS = ('names', 'prices', 'category_codes', 'categories', 'origin_codes', 'origins', 'separators')
+# The columns each derived structure is built from, by its Catalog.derived name
+DERIVED_INPUTS: Dict[str, Sequence[str]] = {
+    'product_keys': ('names', 'category_codes', 'categories', 'origin_codes', 'origins'),
+    'search': ('names',),
+    'facets': ('category_codes', 'categories', 'origin_codes', 'origins'),
+    f'sort:{SORT_PRICE_ASC}': ('prices',),
+    f'sort:{SORT_PRICE_DESC}': ('prices',),
+    f'sort:{SORT_NAME}': ('names', 'category_codes', 'categories'),
+    f'sort:{SORT_CATEGORY}': ('category_codes', 'categories'),
+    'client_payload': COLUMNS,
+}
+
+
+class CatalogDiff:
+    """What changed between two versions, keyed by ProductKey
+
+    repriced maps a key to (old price, new price). Falsy only when every
+    column is identical, i.e. the refresh changed nothing at all.
+    """
+
+    __slots__ = ('added', 'removed', 'repriced', 'changed_columns', 'reused')
+
+    def __init__(self):
+        self.added: List[ProductKey] = []
+        self.removed: List[ProductKey] = []
+        self.repriced: Dict[ProductKey, Tuple[float, float]] = {}
+        self.changed_columns: List[str] = []
+        # Derived structures the new version took over from the old one
+        self.reused: List[str] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.changed_columns)
+
+    def summary(self) -> str:
+        return (f"{len(self.added)} added, {len(self.removed)} removed, {len(self.repriced)} repriced; "
+                f"reused {', '.join(self.reused) or 'no indexes'}")
+
+
+def _carry_over(old: Catalog, new: Catalog, changed: set) -> List[str]:
+    reused = []
+    for name, inputs in DERIVED_INPUTS.items():
+        value = old.cached(name)
+        if value is not None and not changed.intersection(inputs):
+            new.inherit(name, value)
+            reused.append(name)
+
+    index = old.cached('search')
+    if 'search' not in reused and index is not None and new.names[:len(old.names)] == old.names:
+        # Rows were only appended: index just the new names
+        new.inherit('search', index.extended(new.names[len(old.names):]))
+        reused.append('search (extended)')
+    return reused
+
+
+def diff_catalogs(old: Catalog, new: Catalog) -> CatalogDiff:
+    """Diff two versions and let new adopt every index of old that is still valid
+
+    Meant to run on the loader thread before the new version's indexes are
+    built, so the ones that can be reused never get built at all.
+    """
+    diff = CatalogDiff()
+    diff.changed_columns = [column for column in COLUMNS if getattr(old, column) != getattr(new, column)]
+    if not diff.changed_columns:
+        return diff
+    changed = set(diff.changed_columns)
+    diff.reused = _carry_over(old, new, changed)
+
+    keys_changed = bool(changed.intersection(DERIVED_INPUTS['product_keys']))
+    if not keys_changed and 'prices' not in changed:
+        # Only the grouping moved, every product and price is the same
+        return diff
+    old_keys = product_keys(old)
+    new_keys = product_keys(new)
+    if keys_changed:
+        diff.added = [key for key in new_keys if key not in old_keys]
+        diff.removed = [key for key in old_keys if key not in new_keys]
+    old_prices = old.prices
+    new_prices = new.prices
+    for key, index in new_keys.items():
+        old_index = old_keys.get(key)
+        if old_index is not None and old_prices[old_index] != new_prices[index]:
+            diff.repriced[key] = (old_prices[old_index], new_prices[index])
+    return diff
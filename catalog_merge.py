@@ -0,0 +1,176 @@
+"""Catalogs from several worksheets or spreadsheets, loaded in parallel and merged
+
+Each source (a supplier's worksheet, another spreadsheet, a local file) is
+fetched and parsed on its own thread, so a slow sheet does not hold up the
+others. The parsed parts are merged in configuration order: product ids
+are the part's offset plus its own index, and every category is prefixed
+with the source label so two suppliers' "فلاتر" stay separate.
+
+A source that fails, or is still loading when the wait runs out, is served
+from its last good copy: the one in memory, else its own on-disk snapshot.
+A late result still becomes that source's last good copy for the next load.
+"""
+import hashlib
+import os
+import threading
+import time
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from catalog import Catalog, ValidationReport, build_catalog, codes_typecode
+from catalog_snapshot import load_snapshot, save_snapshot
+from catalog_sources import CatalogSource
+
+# How long one load waits for all sources before falling back for the slow ones
+SOURCE_TIMEOUT_SECONDS = 30
+
+
+def merge_catalogs(parts: Sequence[Tuple[str, Catalog]]) -> Catalog:
+    """One catalog from (label, catalog) parts, in order
+
+    Product i of a part gets id offset + i, offset being the number of
+    products in the parts before it. Categories are prefixed with the label,
+    origins with the same name are shared.
+    """
+    names: List[str] = []
+    prices = array('d')
+    categories: List[str] = []
+    category_codes: List[int] = []
+    origin_code_of: Dict[str, int] = {}
+    origin_codes: List[int] = []
+    separators = array('I')
+    report = ValidationReport()
+
+    for label, part in parts:
+        offset = len(names)
+        names.extend(part.names)
+        prices.frombytes(bytes(part.prices))
+        category_base = len(categories)
+        categories.extend(f"{label} - {category}" if label else category for category in part.categories)
+        category_codes.extend([category_base + code for code in part.category_codes])
+        remap = [origin_code_of.setdefault(origin, len(origin_code_of)) for origin in part.origins]
+        origin_codes.extend([remap[code] for code in part.origin_codes])
+        separators.extend([offset + position for position in part.separators])
+        if part.validation is not None:
+            report.merge(label, part.validation)
+
+    catalog = Catalog(names, prices, array(codes_typecode(len(categories)), category_codes), categories,
+                      array(codes_typecode(len(origin_code_of)), origin_codes), list(origin_code_of),
+                      separators)
+    catalog.validation = report
+    return catalog
+
+
+class SourceStatus:
+    """How one source fared in the latest load"""
+
+    __slots__ = ('label', 'loaded_at', 'last_error', 'fallback')
+
+    def __init__(self, label: str):
+        self.label = label
+        self.loaded_at: Optional[float] = None
+        self.last_error: Optional[Exception] = None
+        # None when fresh, else 'memory' or 'disk'
+        self.fallback: Optional[str] = None
+
+
+class MultiSourceLoader:
+    """CatalogStore loader over several sources, fetched concurrently
+
+    Calling it returns the merged catalog. It raises only when no source
+    produced a catalog, fresh or fallback, so the store keeps its snapshot.
+    """
+
+    def __init__(self, sources: Sequence[Tuple[str, CatalogSource]], snapshot_dir: Optional[str] = None,
+                 timeout: float = SOURCE_TIMEOUT_SECONDS):
+        self.sources = list(sources)
+        self.snapshot_dir = snapshot_dir
+        self.timeout = timeout
+        self.status = [SourceStatus(label) for label, _ in self.sources]
+        self._last_good: List[Optional[Catalog]] = [None] * len(self.sources)
+        self._in_flight: List[Optional[Future]] = [None] * len(self.sources)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.sources)),
+                                            thread_name_prefix='catalog-source')
+
+    def describe(self) -> str:
+        return '+'.join(source.describe() for _, source in self.sources)
+
+    def _snapshot_path(self, source: CatalogSource) -> Optional[str]:
+        if not self.snapshot_dir:
+            return None
+        digest = hashlib.sha1(source.describe().encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.snapshot_dir, f"{digest}.snap")
+
+    def _load_source(self, position: int) -> Catalog:
+        _, source = self.sources[position]
+        headers, rows = source.fetch()
+        catalog = build_catalog(headers, rows)
+        self._remember(position, catalog)
+        return catalog
+
+    def _remember(self, position: int, catalog: Catalog):
+        """Keep a fresh part as the source's last good copy, in memory and on disk"""
+        with self._lock:
+            self._last_good[position] = catalog
+            status = self.status[position]
+            status.loaded_at = time.time()
+            status.last_error = None
+            status.fallback = None
+        path = self._snapshot_path(self.sources[position][1])
+        if path:
+            try:
+                save_snapshot(path, catalog, self.sources[position][1].describe())
+            except OSError:
+                pass
+
+    def _fallback(self, position: int, error: Exception) -> Optional[Catalog]:
+        with self._lock:
+            status = self.status[position]
+            status.last_error = error
+            catalog = self._last_good[position]
+            if catalog is not None:
+                status.fallback = 'memory'
+                return catalog
+
+        source = self.sources[position][1]
+        path = self._snapshot_path(source)
+        restored = load_snapshot(path, source.describe()) if path else None
+        if restored is None:
+            return None
+        catalog, saved_at = restored
+        with self._lock:
+            self._last_good[position] = catalog
+            status.loaded_at = saved_at
+            status.fallback = 'disk'
+        return catalog
+
+    def __call__(self) -> Catalog:
+        futures = []
+        for position in range(len(self.sources)):
+            future = self._in_flight[position]
+            if future is None or future.done():
+                future = self._in_flight[position] = self._executor.submit(self._load_source, position)
+            # else a hung fetch from an earlier load is still running: wait on it, don't pile up another
+            futures.append(future)
+        wait(futures, timeout=self.timeout)
+
+        parts = []
+        errors = []
+        for position, future in enumerate(futures):
+            if future.done() and future.exception() is None:
+                catalog = future.result()
+            else:
+                # Still running (its result is remembered when it lands) or failed
+                error = future.exception() if future.done() else TimeoutError(
+                    f"{self.sources[position][0]} took longer than {self.timeout:g}s")
+                catalog = self._fallback(position, error)
+                if catalog is None:
+                    errors.append(error)
+                    continue
+            parts.append((self.sources[position][0], catalog))
+
+        if not parts:
+            raise errors[0] if errors else ValueError("No catalog sources configured")
+        return merge_catalogs(parts)
@@ -0,0 +1,262 @@
+"""One catalog load shared by every app process on the machine
+
+Several Streamlit processes behind a reverse proxy would each fetch the
+sheet, parse it and build the search index. With a SharedCatalogStore in
+every process only one of them does: the one holding the directory's lock
+file runs an ordinary CatalogStore, and every version it loads is written
+to an image file in the shared directory (on /dev/shm, i.e. in memory,
+where available). The image is a catalog snapshot with the search index's
+normalized names, trigram counts and posting lists as extra sections.
+
+The other processes memory-map the image. The numeric columns, the
+product names (a StringColumn, decoded one name at a time) and the posting
+lists are views into the map, so they exist once in memory however many
+processes attach. The normalized names searches scan are decoded in each
+process, as are facet bitmaps, product keys and sort orders, built on
+first use. Every image replaces the previous one with an atomic rename, so a
+process sees either the old or the new version, and an old image lives on
+as long as a process still maps it.
+
+If the loading process exits, its lock is released and the next process
+to poll takes over the loading. Without fcntl (Windows) every process
+loads on its own.
+"""
+import hashlib
+import os
+import struct
+import threading
+import time
+import uuid
+from array import array
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from catalog import Catalog
+from catalog_snapshot import (add_numbers, add_section, catalog_from_sections, catalog_sections, encode_strings,
+                              map_snapshot, read_numbers, read_strings, write_snapshot_file)
+from catalog_store import CatalogSnapshot, CatalogStore
+from search import SearchIndex, get_search_index
+
+IMAGE_NAME = 'catalog.img'
+LOCK_NAME = 'loader.lock'
+# How often a process checks for a new image, and for a vanished loader
+DEFAULT_POLL_SECONDS = 2.0
+# How long the first get() waits for an image before giving up
+FIRST_IMAGE_TIMEOUT_SECONDS = 120
+# Pause between failed first loads in the loading process, so a down source is not hammered
+FIRST_LOAD_RETRY_SECONDS = 30
+
+
+def default_shared_dir(app_dir: str, source_key: str) -> str:
+    """In-memory directory for this catalog source, falling back to the app's cache directory"""
+    name = 'elmohandes-' + hashlib.sha1(source_key.encode('utf-8')).hexdigest()[:12]
+    if os.path.isdir('/dev/shm'):
+        return os.path.join('/dev/shm', name)
+    return os.path.join(app_dir, '.catalog_cache', 'shared', name)
+
+
+def write_image(path: str, snapshot: CatalogSnapshot, generation: str):
+    """Write the snapshot's catalog and search index to path atomically"""
+    catalog = snapshot.data
+    fields, body = catalog_sections(catalog)
+    sections = fields['sections']
+    index = get_search_index(catalog)
+
+    offsets, blob = encode_strings(index.names)
+    add_section(body, sections, 'search/names/offsets', offsets, 'I')
+    add_section(body, sections, 'search/names/data', blob)
+    add_numbers(body, sections, 'search/gram_counts', index.gram_counts, 'H')
+    # Posting lists back to back, with every gram's start in posting_starts
+    grams = list(index.postings)
+    starts = array('I', [0])
+    postings = array('I')
+    for gram in grams:
+        postings.extend(index.postings[gram])
+        starts.append(len(postings))
+    offsets, blob = encode_strings(grams)
+    add_section(body, sections, 'search/grams/offsets', offsets, 'I')
+    add_section(body, sections, 'search/grams/data', blob)
+    add_numbers(body, sections, 'search/posting_starts', starts, 'I')
+    add_numbers(body, sections, 'search/postings', postings, 'I')
+
+    fields.update(generation=generation, saved_at=snapshot.loaded_at, load_seconds=snapshot.load_seconds,
+                  from_disk=snapshot.from_disk)
+    write_snapshot_file(path, fields, body)
+
+
+def _attach_image(mm, fields, body_start) -> Catalog:
+    """Catalog and search index that stay in the mapped image, apart from the trigram keys"""
+    catalog = catalog_from_sections(mm, fields, body_start, shared_names=True)
+    view = memoryview(mm)
+    grams = read_strings(view, fields, body_start, 'search/grams')
+    starts = read_numbers(view, fields, body_start, 'search/posting_starts')
+    postings = read_numbers(view, fields, body_start, 'search/postings')
+    index = SearchIndex.from_parts(
+        # Decoded, since a search reads a large share of them
+        read_strings(view, fields, body_start, 'search/names'),
+        read_numbers(view, fields, body_start, 'search/gram_counts'),
+        {gram: postings[starts[k]:starts[k + 1]] for k, gram in enumerate(grams)},
+    )
+    catalog.inherit('search', index)
+    return catalog
+
+
+class SharedCatalogStore:
+    """Catalog store that loads in one process and shares the result with the others
+
+    Offers the CatalogStore interface the app uses: snapshot, get(),
+    refresh_seconds, loader, last_error, start() and stop(). store is an
+    unstarted CatalogStore; it only runs in the process that holds the lock.
+    """
+
+    def __init__(self, store: CatalogStore, directory: str, poll_seconds: float = DEFAULT_POLL_SECONDS):
+        self.store = store
+        self.directory = directory
+        self.poll_seconds = poll_seconds
+        self.image_path = os.path.join(directory, IMAGE_NAME)
+        self.is_loader = False
+        self._lock_file = None
+        self._generation_prefix = uuid.uuid4().hex[:12]
+        self._attached: Optional[CatalogSnapshot] = None
+        self._attached_generation = None
+        self._image_stat = None
+        self._version = 0
+        self._promote_lock = threading.Lock()
+        self._attach_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        store.publish = self._publish
+
+    @property
+    def refresh_seconds(self) -> float:
+        return self.store.refresh_seconds
+
+    @property
+    def loader(self):
+        """The loader of this process's store; only the loading process reports per-source status"""
+        return self.store.loader if self.is_loader else None
+
+    @property
+    def last_error(self) -> Optional[Exception]:
+        return self.store.last_error if self.is_loader else None
+
+    @property
+    def snapshot(self) -> Optional[CatalogSnapshot]:
+        if self.is_loader:
+            snapshot = self.store.snapshot
+            if snapshot is not None:
+                return snapshot
+        return self._attached
+
+    def get(self) -> CatalogSnapshot:
+        """The current snapshot, waiting for the first image (or loading it) if there is none yet"""
+        deadline = time.time() + FIRST_IMAGE_TIMEOUT_SECONDS
+        while True:
+            snapshot = self.snapshot
+            if snapshot is not None:
+                return snapshot
+            if self._try_promote() or self.is_loader:
+                return self.store.get()
+            self._poll_image()
+            if self._attached is None:
+                if time.time() > deadline:
+                    raise TimeoutError(f"No catalog was published in {self.directory}")
+                time.sleep(0.2)
+
+    def start(self):
+        """Take the loader role if it is free, attach the current image and start polling"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._poll_image()
+        self._try_promote()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='catalog-shared', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.store.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.is_loader:
+                last_attempt = self.store.last_attempt_at
+                if self.store.snapshot is None and (
+                        last_attempt is None or time.time() - last_attempt > FIRST_LOAD_RETRY_SECONDS):
+                    # Nobody asked here yet, but the other processes are waiting for the first image
+                    try:
+                        self.store.get()
+                    except Exception:
+                        pass
+            else:
+                self._poll_image()
+                self._try_promote()
+            self._stop.wait(self.poll_seconds)
+
+    def _try_promote(self) -> bool:
+        """Become the loading process if no other process holds the lock"""
+        if self.is_loader:
+            return False
+        with self._promote_lock:
+            if self.is_loader:
+                return False
+            if fcntl is not None:
+                lock_file = open(os.path.join(self.directory, LOCK_NAME), 'a+')
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    return False
+                # Held for the life of the process; the OS releases it if the process dies
+                self._lock_file = lock_file
+            else:
+                # No way to elect one loader, so every process loads for itself and nobody publishes
+                self.store.publish = None
+            # Versions continue from the ones this process already served, so caches keyed by version stay valid
+            self.store.continue_versions(self._version)
+            self.is_loader = True
+        self.store.start()
+        return True
+
+    def _publish(self, snapshot: CatalogSnapshot):
+        write_image(self.image_path, snapshot, f'{self._generation_prefix}-{snapshot.version}')
+
+    def _poll_image(self):
+        """Attach the published image if it changed since the last look"""
+        # get() and the polling thread may both look; only one attaches
+        with self._attach_lock:
+            self._attach_if_changed()
+
+    def _attach_if_changed(self):
+        try:
+            stat = os.stat(self.image_path)
+        except OSError:
+            return
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key == self._image_stat:
+            return
+        try:
+            mm, fields, body_start = map_snapshot(self.image_path)
+            generation = fields['generation']
+            if generation == self._attached_generation:
+                # Same catalog, republished after a refresh that changed nothing
+                previous = self._attached
+                self._attached = CatalogSnapshot(previous.data, previous.version, fields['saved_at'],
+                                                 fields['load_seconds'], from_disk=fields['from_disk'])
+            else:
+                catalog = _attach_image(mm, fields, body_start)
+                self._version += 1
+                self._attached = CatalogSnapshot(catalog, self._version, fields['saved_at'],
+                                                 fields['load_seconds'], from_disk=fields['from_disk'])
+                self._attached_generation = generation
+        except (OSError, ValueError, KeyError, IndexError, TypeError, struct.error):
+            # A half-visible or foreign file; the next poll tries again
+            return
+        self._image_stat = key
@@ -0,0 +1,205 @@
+"""Compact on-disk snapshot of the columnar catalog for warm restarts
+
+Layout (all numbers little-endian):
+
+    8 bytes   magic b'ELMCAT02'
+    4 bytes   length of the JSON header
+    n bytes   JSON header: counts, category and origin values, section offsets
+    sections  names (uint32 offsets + one UTF-8 blob), prices (float64),
+              category and origin codes, separator positions (uint32)
+
+Sections are 8-byte aligned. On little-endian machines the numeric columns
+of a loaded catalog are views straight into the memory map, so only the
+product names are decoded. Readers look sections up by name, so a file may
+carry more sections than the catalog columns (catalog_shared adds the
+search index) and still load as a plain snapshot.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from typing import Dict, Optional, Sequence, Tuple
+
+from catalog import Catalog, StringColumn
+
+MAGIC = b'ELMCAT02'
+LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def _le_bytes(values) -> bytes:
+    """Bytes of a numeric array or memoryview in little-endian order"""
+    if LITTLE_ENDIAN:
+        return bytes(values)
+    typecode = values.format if isinstance(values, memoryview) else values.typecode
+    swapped = array(typecode, values)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def _pad(out: bytearray):
+    out.extend(b'\0' * (-len(out) % 8))
+
+
+def encode_strings(values: Sequence[str]) -> Tuple[bytes, bytes]:
+    """Encode a text column as (uint32 offsets, utf-8 blob)"""
+    offsets = array('I', [0])
+    chunks = []
+    position = 0
+    for value in values:
+        encoded = value.encode('utf-8')
+        chunks.append(encoded)
+        position += len(encoded)
+        offsets.append(position)
+    return _le_bytes(offsets), b''.join(chunks)
+
+
+def decode_strings(offsets, blob: bytes) -> Tuple[str, ...]:
+    return tuple(blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1))
+
+
+def add_section(body: bytearray, sections: Dict, name: str, payload, typecode: Optional[str] = None):
+    """Append payload to body as a named 8-byte aligned section"""
+    _pad(body)
+    sections[name] = [len(body), len(payload), typecode]
+    body.extend(payload)
+
+
+def add_numbers(body: bytearray, sections: Dict, name: str, values, typecode: str):
+    add_section(body, sections, name, _le_bytes(values), typecode)
+
+
+def read_section(view: memoryview, fields: Dict, body_start: int, name: str) -> memoryview:
+    offset, length, _ = fields['sections'][name]
+    return view[body_start + offset:body_start + offset + length]
+
+
+def read_numbers(view: memoryview, fields: Dict, body_start: int, name: str):
+    """A numeric section as a view into the buffer, or a byteswapped copy on big-endian machines"""
+    typecode = fields['sections'][name][2]
+    raw = read_section(view, fields, body_start, name)
+    if LITTLE_ENDIAN:
+        return raw.cast(typecode)
+    values = array(typecode, bytes(raw))
+    values.byteswap()
+    return values
+
+
+def read_strings(view: memoryview, fields: Dict, body_start: int, name: str) -> Tuple[str, ...]:
+    return decode_strings(read_numbers(view, fields, body_start, name + '/offsets'),
+                          bytes(read_section(view, fields, body_start, name + '/data')))
+
+
+def read_string_column(buf, fields: Dict, body_start: int, name: str) -> StringColumn:
+    """A text section left in buf and decoded on access"""
+    offsets = read_numbers(memoryview(buf), fields, body_start, name + '/offsets')
+    return StringColumn(offsets, buf, body_start + fields['sections'][name + '/data'][0])
+
+
+def catalog_sections(catalog: Catalog) -> Tuple[Dict, bytearray]:
+    """Serialize the catalog columns into (header fields, 8-byte aligned body)"""
+    body = bytearray()
+    sections = {}
+
+    offsets, blob = encode_strings(catalog.names)
+    add_section(body, sections, 'names/offsets', offsets, 'I')
+    add_section(body, sections, 'names/data', blob)
+    add_numbers(body, sections, 'prices', catalog.prices, 'd')
+    add_numbers(body, sections, 'category_codes', catalog.category_codes, catalog.category_codes.format)
+    add_numbers(body, sections, 'origin_codes', catalog.origin_codes, catalog.origin_codes.format)
+    add_numbers(body, sections, 'separators', catalog.separators, 'I')
+
+    fields = {
+        'products': len(catalog),
+        'categories': list(catalog.categories),
+        'origins': list(catalog.origins),
+        'sections': sections,
+    }
+    return fields, body
+
+
+def catalog_from_sections(buf, fields: Dict, body_start: int, shared_names: bool = False) -> Catalog:
+    """Rebuild a catalog whose numeric columns are views into buf
+
+    With shared_names the product names stay in buf as a StringColumn
+    instead of being decoded.
+    """
+    view = memoryview(buf)
+
+    def numbers(name):
+        return read_numbers(view, fields, body_start, name)
+
+    if shared_names:
+        names = read_string_column(buf, fields, body_start, 'names')
+    else:
+        names = read_strings(view, fields, body_start, 'names')
+    if len(names) != fields['products']:
+        raise ValueError("Snapshot names do not match the product count")
+    return Catalog(names, numbers('prices'), numbers('category_codes'), fields['categories'],
+                   numbers('origin_codes'), fields['origins'], numbers('separators'))
+
+
+def save_snapshot(path: str, catalog: Catalog, source_key: str = ''):
+    """Write the catalog to path atomically"""
+    fields, body = catalog_sections(catalog)
+    fields.update(source=source_key, saved_at=time.time())
+    write_snapshot_file(path, fields, body)
+
+
+def write_snapshot_file(path: str, fields: Dict, body: bytearray):
+    """Write header fields and body to path atomically"""
+    header = json.dumps(fields, ensure_ascii=False).encode('utf-8')
+
+    prefix = bytearray(MAGIC + struct.pack('<I', len(header)) + header)
+    _pad(prefix)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # Write next to the target and rename, so readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.catalog-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(prefix)
+            f.write(body)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _read_header(buf) -> Tuple[Dict, int]:
+    if buf[:8] != MAGIC:
+        raise ValueError("Not a catalog snapshot")
+    (header_len,) = struct.unpack_from('<I', buf, 8)
+    header = json.loads(buf[12:12 + header_len].decode('utf-8'))
+    body_start = 12 + header_len
+    body_start += -body_start % 8
+    return header, body_start
+
+
+def map_snapshot(path: str) -> Tuple[mmap.mmap, Dict, int]:
+    """Memory-map a snapshot file read-only and return (map, header fields, body start)"""
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header, body_start = _read_header(mm)
+    return mm, header, body_start
+
+
+def load_snapshot(path: str, source_key: Optional[str] = None) -> Optional[Tuple[Catalog, float]]:
+    """Memory-map a snapshot and return (catalog, saved_at)
+
+    Returns None when the file is missing, unreadable, or was written for a
+    different source. The map stays open for as long as the catalog uses it.
+    """
+    try:
+        mm, header, body_start = map_snapshot(path)
+        if source_key is not None and header.get('source') != source_key:
+            return None
+        catalog = catalog_from_sections(mm, header, body_start)
+    except (OSError, ValueError, KeyError, IndexError, TypeError, struct.error):
+        return None
+    return catalog, header['saved_at']
@@ -0,0 +1,205 @@
+"""Catalog sources: Google Sheets, local CSV files and SQLite databases
+
+Every source returns the sheet as a header row plus data rows of strings,
+so they all feed the same parsing in catalog.build_catalog.
+"""
+import csv
+import sqlite3
+from typing import List, Mapping, Optional, Sequence, Tuple
+
+from catalog import REQUIRED_COLUMNS
+
+Grid = Tuple[List[str], List[List[str]]]
+
+# Scopes needed to read the spreadsheet with a service account
+GOOGLE_SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets.readonly',
+    'https://www.googleapis.com/auth/drive.readonly'
+]
+
+
+def column_letter(index: int) -> str:
+    """A1-notation letters of a 0-based column index: 0 -> A, 27 -> AB"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _cell_to_str(value) -> str:
+    """Normalize a raw cell to the string form gspread returns"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class CatalogSource:
+    """Base class for anything that can provide the product sheet"""
+
+    name = 'base'
+
+    def fetch(self) -> Grid:
+        """Return (headers, data_rows) with every cell as a string"""
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return self.name
+
+
+class GoogleSheetSource(CatalogSource):
+    """Reads the required columns of one worksheet (the first by default) with a service account
+
+    Only the header row and the four required columns are downloaded, in one
+    batched values request, so notes and helper columns the office keeps in
+    the sheet cost nothing. Column positions are resolved from the header
+    row and remembered; when the header shows they moved, they are resolved
+    again and the columns fetched once more.
+    """
+
+    name = 'google'
+
+    def __init__(self, credentials_info: Mapping, sheet_id: str, worksheet: Optional[str] = None):
+        self.credentials_info = dict(credentials_info)
+        self.sheet_id = sheet_id
+        self.worksheet = worksheet
+        self.columns: Optional[List[int]] = None
+
+    def _open_worksheet(self):
+        # Imported here so local sources work without the Google client libraries
+        import gspread
+        from google.oauth2.service_account import Credentials
+
+        credentials = Credentials.from_service_account_info(self.credentials_info, scopes=GOOGLE_SCOPES)
+        gc = gspread.authorize(credentials)
+        spreadsheet = gc.open_by_key(self.sheet_id)
+        return spreadsheet.worksheet(self.worksheet) if self.worksheet else spreadsheet.sheet1
+
+    @staticmethod
+    def _resolve_columns(headers: Sequence[str]) -> Optional[List[int]]:
+        headers = [str(header).strip() for header in headers]
+        if not all(column in headers for column in REQUIRED_COLUMNS):
+            return None
+        return [headers.index(column) for column in REQUIRED_COLUMNS]
+
+    @staticmethod
+    def _fetch_columns(worksheet, columns: Sequence[int]) -> Tuple[List[str], List[Tuple[str, ...]]]:
+        """One batchGet for the header row plus each required column below it"""
+        ranges = ['1:1'] + [f'{column_letter(c)}2:{column_letter(c)}' for c in columns]
+        header_range, *column_ranges = worksheet.batch_get(ranges, major_dimension='COLUMNS')
+        headers = [cells[0] if cells else '' for cells in header_range]
+        # Each range is [column values]; the API leaves out an empty column and trailing empty cells
+        values = [column_range[0] if column_range else [] for column_range in column_ranges]
+        height = max((len(column) for column in values), default=0)
+        values = [list(column) + [''] * (height - len(column)) for column in values]
+        # Rows stay tuples: 100k small lists would mostly cost garbage collector time
+        return headers, list(zip(*values))
+
+    def fetch(self) -> Grid:
+        worksheet = self._open_worksheet()
+        if self.columns is None:
+            header_range = worksheet.batch_get(['1:1'])
+            headers = list(header_range[0][0]) if header_range and header_range[0] else []
+            self.columns = self._resolve_columns(headers)
+            if self.columns is None:
+                # Let build_catalog report the missing column
+                return headers, []
+
+        headers, rows = self._fetch_columns(worksheet, self.columns)
+        columns = self._resolve_columns(headers)
+        if columns != self.columns:
+            # The office moved or renamed a column since the last fetch
+            self.columns = columns
+            if columns is None:
+                return headers, []
+            headers, rows = self._fetch_columns(worksheet, columns)
+        return list(REQUIRED_COLUMNS), rows
+
+    def describe(self) -> str:
+        if self.worksheet:
+            return f"google:{self.sheet_id}#{self.worksheet}"
+        return f"google:{self.sheet_id}"
+
+
+class CsvSource(CatalogSource):
+    """Reads the catalog from a local CSV file with the sheet's header row"""
+
+    name = 'csv'
+
+    def __init__(self, path: str, encoding: str = 'utf-8-sig'):
+        self.path = path
+        self.encoding = encoding
+
+    def fetch(self) -> Grid:
+        with open(self.path, newline='', encoding=self.encoding) as f:
+            all_values = list(csv.reader(f))
+        if not all_values:
+            return [], []
+        return all_values[0], all_values[1:]
+
+    def describe(self) -> str:
+        return f"csv:{self.path}"
+
+
+class SqliteSource(CatalogSource):
+    """Reads the catalog from a SQLite table, in rowid order
+
+    Blank separator rows are stored as rows whose columns are all NULL or ''.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str, table: str = 'products'):
+        self.path = path
+        self.table = table
+
+    def fetch(self) -> Grid:
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            cursor = conn.execute(f'SELECT * FROM "{self.table}" ORDER BY rowid')
+            headers = [column[0] for column in cursor.description]
+            rows = [[_cell_to_str(value) for value in row] for row in cursor]
+        finally:
+            conn.close()
+        return headers, rows
+
+    def describe(self) -> str:
+        return f"sqlite:{self.path}#{self.table}"
+
+
+def _source_from_config(config: Mapping, secrets: Mapping) -> CatalogSource:
+    kind = config.get('source', 'google')
+
+    if kind == 'google':
+        sheet_id = config.get('sheet_id') or secrets['google']['sheet_id']
+        return GoogleSheetSource(secrets['gcp_service_account'], sheet_id, worksheet=config.get('worksheet'))
+    if kind == 'csv':
+        return CsvSource(config['path'], encoding=config.get('encoding', 'utf-8-sig'))
+    if kind == 'sqlite':
+        return SqliteSource(config['path'], table=config.get('table', 'products'))
+    raise ValueError(f"Unknown catalog source: {kind}")
+
+
+def source_from_secrets(secrets: Mapping) -> CatalogSource:
+    """Build the catalog source configured in the [catalog] secrets section
+
+    Without a [catalog] section the app keeps reading from Google Sheets.
+    """
+    return _source_from_config(dict(secrets.get('catalog', {})), secrets)
+
+
+def sources_from_secrets(secrets: Mapping) -> List[Tuple[str, CatalogSource]]:
+    """(label, source) for every [[catalog.sources]] entry, in order; empty when there are none
+
+    Each entry takes the same keys as [catalog] plus an optional label, which
+    defaults to the worksheet name or the source description.
+    """
+    sources = []
+    for entry in dict(secrets.get('catalog', {})).get('sources', []):
+        entry = dict(entry)
+        source = _source_from_config(entry, secrets)
+        sources.append((entry.get('label') or entry.get('worksheet') or source.describe(), source))
+    return sources
@@ -0,0 +1,250 @@
+"""Process-wide catalog store with stale-while-revalidate background refresh
+
+Sessions always read the last successfully loaded snapshot. A daemon thread
+reloads the catalog every refresh_seconds and swaps the new snapshot in with
+a single attribute assignment, so readers never see a half-built catalog and
+never wait on the network once the first load has finished. Loads go through
+a single-flight guard, so a burst of callers on a cold store triggers exactly
+one fetch.
+
+With a snapshot_path the store also persists every successful load to disk
+and restores it on start, so a restarted process serves the previous catalog
+immediately while the first fresh fetch runs behind it.
+
+With a diff function every load is compared with the current data first.
+The result is kept on the new snapshot as changes, and a load that changed
+nothing keeps the current data and version, so nothing downstream is
+invalidated.
+
+With a publish function every snapshot the store swaps in is also handed
+to it once prepared, which is how catalog_shared shares the loads of one
+process with the others.
+"""
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from catalog_snapshot import load_snapshot, save_snapshot
+
+
+class _Call:
+    """A load in progress that concurrent callers can wait on"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[Exception] = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls so only one runs and every caller shares its outcome
+
+    The first caller runs fn; callers arriving while it runs block until it
+    finishes and receive the same result, or the same exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._call: Optional[_Call] = None
+
+    def do(self, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._call
+            leader = call is None
+            if leader:
+                call = self._call = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._call = None
+            call.done.set()
+        return call.result
+
+
+class CatalogSnapshot:
+    """One successfully loaded version of the catalog"""
+
+    __slots__ = ('data', 'version', 'loaded_at', 'load_seconds', 'from_disk', 'changes')
+
+    def __init__(self, data: Any, version: int, loaded_at: float, load_seconds: float,
+                 from_disk: bool = False, changes: Any = None):
+        self.data = data
+        self.version = version
+        self.loaded_at = loaded_at
+        self.load_seconds = load_seconds
+        self.from_disk = from_disk
+        # What the diff function found against the previous version, if there was one
+        self.changes = changes
+
+
+class CatalogStore:
+    """Holds the current catalog snapshot and refreshes it in the background"""
+
+    def __init__(self, loader: Callable[[], Any], refresh_seconds: float = 300,
+                 snapshot_path: Optional[str] = None, source_key: str = '',
+                 prepare: Optional[Callable[[Any], None]] = None,
+                 diff: Optional[Callable[[Any, Any], Any]] = None,
+                 publish: Optional[Callable[[CatalogSnapshot], None]] = None):
+        self.loader = loader
+        self.prepare = prepare
+        self.diff = diff
+        self.publish = publish
+        self.refresh_seconds = refresh_seconds
+        self.snapshot_path = snapshot_path
+        self.source_key = source_key
+        self.last_error: Optional[Exception] = None
+        self.last_attempt_at: Optional[float] = None
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._version = 0
+        self._flight = SingleFlight()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def snapshot(self) -> Optional[CatalogSnapshot]:
+        return self._snapshot
+
+    @property
+    def last_refresh(self) -> Optional[float]:
+        """Time of the last successful load, or None before the first one"""
+        snapshot = self._snapshot
+        return snapshot.loaded_at if snapshot is not None else None
+
+    def get(self) -> CatalogSnapshot:
+        """Return the current snapshot, loading it only if none exists yet"""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        return self._flight.do(self._load_if_missing)
+
+    def refresh(self) -> CatalogSnapshot:
+        """Reload the catalog now and swap it in; raises if the load fails
+
+        Concurrent refreshes share a single load instead of each fetching.
+        """
+        return self._flight.do(self._load)
+
+    def _load_if_missing(self) -> CatalogSnapshot:
+        # A load may have finished between our check and becoming the leader
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        return self._load()
+
+    def _load(self) -> CatalogSnapshot:
+        started = time.time()
+        self.last_attempt_at = started
+        previous = self._snapshot
+        changes = None
+        try:
+            data = self.loader()
+            if self.diff is not None and previous is not None:
+                changes = self.diff(previous.data, data)
+                if not changes:
+                    # Nothing changed: keep the current version, only the refresh time moves
+                    finished = time.time()
+                    self._snapshot = CatalogSnapshot(previous.data, previous.version, finished,
+                                                     finished - started, changes=previous.changes)
+                    self.last_error = None
+                    self._publish(self._snapshot)
+                    return self._snapshot
+            if self.prepare is not None:
+                # Build derived indexes before the swap so no session waits on them
+                self.prepare(data)
+        except Exception as e:
+            self.last_error = e
+            raise
+        finished = time.time()
+        self._version += 1
+        snapshot = CatalogSnapshot(data, self._version, finished, finished - started, changes=changes)
+        # Single reference swap: readers see either the old or the new snapshot
+        self._snapshot = snapshot
+        self.last_error = None
+        self._persist(snapshot)
+        self._publish(snapshot)
+        return snapshot
+
+    def _persist(self, snapshot: CatalogSnapshot):
+        if not self.snapshot_path:
+            return
+        try:
+            save_snapshot(self.snapshot_path, snapshot.data, self.source_key)
+        except OSError:
+            # A read-only or full disk only costs us the warm restart
+            pass
+
+    def _publish(self, snapshot: CatalogSnapshot):
+        if self.publish is None:
+            return
+        try:
+            self.publish(snapshot)
+        except OSError:
+            # Other processes keep the previous version until the next publish works
+            pass
+
+    def continue_versions(self, version: int):
+        """Number the next snapshot after version, for a store taking over from another source of versions"""
+        self._version = max(self._version, version)
+
+    def restore(self) -> bool:
+        """Serve the on-disk snapshot until the first fresh load finishes"""
+        if not self.snapshot_path or self._snapshot is not None:
+            return False
+        started = time.time()
+        restored = load_snapshot(self.snapshot_path, self.source_key)
+        if restored is None:
+            return False
+        data, saved_at = restored
+        self._version += 1
+        self._snapshot = CatalogSnapshot(data, self._version, saved_at, time.time() - started,
+                                         from_disk=True)
+        return True
+
+    def start(self):
+        """Restore the disk snapshot and start the background refresher thread"""
+        restored = self.restore()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if self.refresh_seconds <= 0 and not restored:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='catalog-refresher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.from_disk:
+            if self.prepare is not None:
+                self.prepare(snapshot.data)
+            self._publish(snapshot)
+            # Replace the restored snapshot with fresh data right away
+            self._refresh_quietly()
+        if self.refresh_seconds <= 0:
+            return
+        while not self._stop.wait(self.refresh_seconds):
+            self._refresh_quietly()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            # Keep serving the last-known-good snapshot; the error stays in last_error
+            pass
@@ -0,0 +1,84 @@
+"""Origin and category facets as per-value bitmaps, built once per catalog version
+
+Every origin and category value gets a bitmap of the products that have it,
+stored as a Python int with bit i set for product i. Combining facets with
+each other and with the text query is then a handful of big-int AND/OR
+operations done in C, and a facet count is a popcount, instead of a Python
+loop over the catalog on every rerun.
+"""
+from array import array
+from typing import Iterable, List, Sequence, Tuple
+
+from catalog import Catalog
+
+# Set bit positions of every byte value, for turning bitmaps back into indices
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+
+
+def bitmap_from_indices(indices: Iterable[int], size: int) -> int:
+    """Bitmap with the bits of the given product indices set"""
+    buf = bytearray((size + 7) // 8)
+    for i in indices:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def indices_from_bitmap(bitmap: int) -> array:
+    """Ascending product indices of the set bits"""
+    indices = array('I')
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for offset, value in enumerate(data):
+        if value:
+            base = offset << 3
+            indices.extend([base + bit for bit in _BYTE_BITS[value]])
+    return indices
+
+
+def _code_bitmaps(codes, value_count: int) -> Tuple[int, ...]:
+    buffers = [bytearray((len(codes) + 7) // 8) for _ in range(value_count)]
+    for i, code in enumerate(codes):
+        buffers[code][i >> 3] |= 1 << (i & 7)
+    return tuple(int.from_bytes(buf, 'little') for buf in buffers)
+
+
+class FacetIndex:
+    """Bitmaps of every origin and category value, indexed by their codes"""
+
+    __slots__ = ('size', 'all', 'origins', 'categories')
+
+    def __init__(self, catalog: Catalog):
+        self.size = len(catalog)
+        self.all = (1 << self.size) - 1
+        self.origins = _code_bitmaps(catalog.origin_codes, len(catalog.origins))
+        self.categories = _code_bitmaps(catalog.category_codes, len(catalog.categories))
+
+    @staticmethod
+    def _union(bitmaps: Sequence[int], codes: Iterable[int], everything: int) -> int:
+        """Products having any of the codes; no codes selected means no restriction"""
+        selected = everything
+        for n, code in enumerate(codes):
+            selected = bitmaps[code] if n == 0 else selected | bitmaps[code]
+        return selected
+
+    def origin_mask(self, codes: Iterable[int]) -> int:
+        return self._union(self.origins, codes, self.all)
+
+    def category_mask(self, codes: Iterable[int]) -> int:
+        return self._union(self.categories, codes, self.all)
+
+    def counts(self, matches: int, origin_codes: Sequence[int] = (),
+               category_codes: Sequence[int] = ()) -> Tuple[List[int], List[int]]:
+        """Live (origin counts, category counts) for the products in the matches bitmap
+
+        Each facet's counts apply the other facet's selection but not its own,
+        so they tell how many products picking that value would add.
+        """
+        by_category = matches & self.category_mask(category_codes)
+        by_origin = matches & self.origin_mask(origin_codes)
+        return ([(by_category & bitmap).bit_count() for bitmap in self.origins],
+                [(by_origin & bitmap).bit_count() for bitmap in self.categories])
+
+
+def get_facet_index(catalog: Catalog) -> FacetIndex:
+    """The facet bitmaps for this catalog version, built on first use"""
+    return catalog.derived('facets', FacetIndex)
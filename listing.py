@@ -0,0 +1,239 @@
+"""Filtered, grouped product listings and a cross-session cache for them
+
+A listing is what the product table pages through: product indices
+interleaved with separator markers. Computing one means a search and a
+grouping pass, so listings are cached per (catalog version, normalized
+query, selected origins and categories, search mode, sort order) and shared
+by every session. A catalog refresh changes the version, which retires the old entries.
+
+Each listing also carries a page index: where every page starts and ends in
+the rows and where every category starts. Showing page k is a slice, and
+jumping to a category is a binary search.
+"""
+import hashlib
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Sequence, Tuple
+
+from catalog import Catalog, group_products_by_category
+from facets import bitmap_from_indices, get_facet_index, indices_from_bitmap
+from metrics import span
+from search import get_search_index, query_terms
+from sorting import GROUPED_SORTS, SORT_DEFAULT, group_sorted, sorted_products
+
+LISTING_CACHE_SIZE = 128
+PRODUCTS_PER_PAGE = 15
+
+
+class Listing:
+    """One filter result: the rows to page through, how many are products, and its page index
+
+    Pages hold up to PRODUCTS_PER_PAGE products with the separators between
+    them. Separators that fall between two pages are not shown, so a page
+    never starts or ends with a separator. category_starts lists
+    (category code, row offset) for every category run in the rows. token
+    identifies the cached listing to the browser components. origin_counts
+    and category_counts are the live facet counts, indexed by code.
+    """
+
+    __slots__ = ('rows', 'product_count', 'ranked', 'page_starts', 'page_ends', 'category_starts', 'token',
+                 'origin_counts', 'category_counts')
+
+    def __init__(self, rows: array, product_count: int, ranked: bool,
+                 category_codes=None, per_page: int = PRODUCTS_PER_PAGE):
+        self.rows = rows
+        self.product_count = product_count
+        self.ranked = ranked
+        self.page_starts, self.page_ends, self.category_starts = _page_index(rows, category_codes, per_page)
+        self.token = ''
+        self.origin_counts: List[int] = []
+        self.category_counts: List[int] = []
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_starts)
+
+    def page(self, number: int) -> array:
+        """Rows of page number (1-based), clamped to the valid range"""
+        if not self.page_starts:
+            return self.rows[:0]
+        k = min(max(number, 1), len(self.page_starts)) - 1
+        return self.rows[self.page_starts[k]:self.page_ends[k]]
+
+    def page_of_row(self, offset: int) -> int:
+        """1-based page that shows the row at offset"""
+        return max(1, bisect_right(self.page_starts, offset))
+
+    def category_pages(self) -> List[Tuple[int, int]]:
+        """(category code, 1-based page) for every category run, in listing order"""
+        return [(code, self.page_of_row(offset)) for code, offset in self.category_starts]
+
+
+def _page_index(rows: array, category_codes, per_page: int):
+    """Page boundaries and category starts in one pass over the rows"""
+    page_starts = array('I')
+    page_ends = array('I')
+    category_starts: List[Tuple[int, int]] = []
+    on_page = 0
+    current_category = None
+
+    for offset, row in enumerate(rows):
+        if row < 0:
+            continue
+        if on_page == per_page:
+            on_page = 0
+        if on_page == 0:
+            page_starts.append(offset)
+            page_ends.append(offset + 1)
+        on_page += 1
+        page_ends[-1] = offset + 1
+        if category_codes is not None:
+            category = category_codes[row]
+            if category != current_category:
+                category_starts.append((category, offset))
+                current_category = category
+
+    return page_starts, page_ends, category_starts
+
+
+def _codes(values: Sequence[str], selected: Sequence[str]) -> List[int]:
+    return [values.index(value) for value in selected if value in values]
+
+
+def _sorted_listing(catalog: Catalog, product_indices: Sequence[int], sort: str, ranked: bool) -> Listing:
+    """Listing of products in a non-default sort order, gathered through its permutation"""
+    product_indices = sorted_products(catalog, product_indices, sort)
+    if sort in GROUPED_SORTS:
+        rows = group_sorted(catalog, product_indices)
+        return Listing(array('i', rows), len(product_indices), ranked, catalog.category_codes)
+    # Price orders mix categories, so they are shown without separators
+    return Listing(array('i', product_indices), len(product_indices), ranked)
+
+
+def compute_listing(catalog: Catalog, query: str = '', origins: Sequence[str] = (),
+                    categories: Sequence[str] = (), fuzzy: bool = False, sort: str = SORT_DEFAULT) -> Listing:
+    """Filter the catalog by search query and origin and category facets, then lay it out for display
+
+    An empty facet selection does not filter. Fuzzy results are ranked best
+    first and shown without category grouping; they are also shown when the
+    exact search finds nothing, so a typo still finds the part. Everything
+    else keeps sheet order with category and sub-category separators. Any
+    other sort order replaces both. Facet counts are over the products
+    containing every query term, or over the ranked matches when those are
+    shown, so a typo query does not list every facet value with no products.
+    """
+    with span('filter'):
+        facets = get_facet_index(catalog)
+        origin_codes = _codes(catalog.origins, origins)
+        category_codes = _codes(catalog.categories, categories)
+        filtered = bool(origin_codes or category_codes)
+        selected = facets.origin_mask(origin_codes) & facets.category_mask(category_codes)
+
+        index = get_search_index(catalog)
+        exact = index.search(query) if query_terms(query) else None
+        ranked = exact is not None and (fuzzy or not exact)
+        if ranked:
+            # Ranked, typo-tolerant top matches, best first and without category grouping
+            product_indices = [i for i, _ in index.fuzzy_search(query)]
+            # Counted over the top matches before the facet selection too, like exact matches, so every
+            # facet value shows what picking it would add
+            matches = bitmap_from_indices(product_indices, len(catalog))
+            if filtered:
+                product_indices = [i for i, _ in index.fuzzy_search(query, within=indices_from_bitmap(selected))]
+                matches |= bitmap_from_indices(product_indices, len(catalog))
+        else:
+            matches = bitmap_from_indices(exact, len(catalog)) if exact is not None else facets.all
+            if filtered:
+                # Arabic-aware query matches and facets combined as one bitmap intersection
+                product_indices = indices_from_bitmap(matches & selected)
+            else:
+                product_indices = exact if exact is not None else range(len(catalog))
+        origin_counts, category_counts = facets.counts(matches, origin_codes, category_codes)
+
+    with span('group'):
+        if ranked:
+            if sort != SORT_DEFAULT:
+                # Still the best matches, just shown in the chosen order
+                listing = _sorted_listing(catalog, product_indices, sort, True)
+            else:
+                listing = Listing(array('i', product_indices), len(product_indices), True)
+        elif sort != SORT_DEFAULT:
+            listing = _sorted_listing(catalog, product_indices, sort, False)
+        else:
+            # Group products by category with separators (now including sub-category separators)
+            rows = group_products_by_category(catalog, product_indices)
+            listing = Listing(array('i', rows), len(product_indices), False, catalog.category_codes)
+
+    listing.origin_counts = origin_counts
+    listing.category_counts = category_counts
+    return listing
+
+
+class LRUCache:
+    """Thread-safe bounded LRU mapping with hit and miss counters"""
+
+    def __init__(self, maxsize: int = LISTING_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            # Computed outside the lock; two sessions racing on a miss both compute
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+
+def cached_listing(cache: LRUCache, version: int, catalog: Catalog, query: str = '',
+                   origins: Sequence[str] = (), categories: Sequence[str] = (),
+                   fuzzy: bool = False, sort: str = SORT_DEFAULT) -> Listing:
+    """compute_listing through the shared cache, keyed by the normalized query, facets and sort"""
+    normalized_query = ' '.join(query_terms(query))
+    origins = tuple(sorted(set(origins)))
+    categories = tuple(sorted(set(categories)))
+    key = (version, normalized_query, origins, categories, bool(fuzzy and normalized_query), sort)
+
+    def compute():
+        listing = compute_listing(catalog, normalized_query, origins, categories, fuzzy, sort)
+        listing.token = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+        return listing
+
+    return cache.get_or_compute(key, compute)
@@ -0,0 +1,210 @@
+"""In-process timing histograms for script reruns, exported in Prometheus text format
+
+Stages of a rerun are timed with span() and aggregated into fixed-bucket
+histograms, one per stage, in a process-wide registry. Every session's
+reruns land in the same histograms, so p50/p99 come out of the buckets
+(Prometheus' histogram_quantile, or quantile() here) without keeping
+individual samples.
+
+Counters and gauges kept elsewhere, such as the listing cache's hits and
+misses, are registered with register_value() and read at every export.
+
+The text exposition can be written to a file on an interval, for a node
+exporter textfile collector or a quick look, or served over HTTP on a local
+port for Prometheus to scrape.
+"""
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+METRIC_NAME = 'elmohandes_stage_seconds'
+# Upper bounds in seconds; reruns range from sub-millisecond cache hits to multi-second cold loads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_WRITE_SECONDS = 15
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations, safe to observe from any thread"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum', '_lock')
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One slot per bucket plus the +Inf overflow
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        slot = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[slot] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def cumulative(self) -> List[int]:
+        with self._lock:
+            counts = list(self.counts)
+        total = 0
+        for i, count in enumerate(counts):
+            total += count
+            counts[i] = total
+        return counts
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate of the q-quantile by linear interpolation within buckets, like histogram_quantile"""
+        cumulative = self.cumulative()
+        if not cumulative[-1]:
+            return None
+        rank = q * cumulative[-1]
+        slot = bisect_left(cumulative, rank)
+        if slot >= len(self.buckets):
+            # In the +Inf bucket: the best estimate is the largest finite bound
+            return self.buckets[-1]
+        lower = self.buckets[slot - 1] if slot > 0 else 0.0
+        below = cumulative[slot - 1] if slot > 0 else 0
+        in_bucket = cumulative[slot] - below
+        return lower + (self.buckets[slot] - lower) * ((rank - below) / in_bucket if in_bucket else 0.0)
+
+
+class MetricsRegistry:
+    """Stage histograms by name, plus registered single-value metrics"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[str, Histogram] = {}
+        self._values: Dict[str, Tuple[str, str, Callable[[], float]]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str) -> Histogram:
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, stage: str, seconds: float):
+        self.histogram(stage).observe(seconds)
+
+    def register_value(self, name: str, help_text: str, read: Callable[[], float], kind: str = 'gauge'):
+        """Export read() as metric name at every render; kind is 'gauge' or 'counter'
+
+        Registering a name again replaces the earlier reader.
+        """
+        with self._lock:
+            self._values[name] = (kind, help_text, read)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Time the block, exceptions included (st.rerun and st.stop end a stage by raising)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def render(self) -> str:
+        """All histograms and registered values in the Prometheus text exposition format"""
+        lines = [
+            f'# HELP {METRIC_NAME} Time spent in each stage of a Streamlit script rerun.',
+            f'# TYPE {METRIC_NAME} histogram',
+        ]
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            values = sorted(self._values.items())
+        for stage, histogram in histograms:
+            label = stage.replace('\\', '\\\\').replace('"', '\\"')
+            for bound, count in zip(histogram.buckets + (float('inf'),), histogram.cumulative()):
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{METRIC_NAME}_bucket{{stage="{label}",le="{le}"}} {count}')
+            lines.append(f'{METRIC_NAME}_sum{{stage="{label}"}} {histogram.sum!r}')
+            lines.append(f'{METRIC_NAME}_count{{stage="{label}"}} {histogram.count}')
+        for name, (kind, help_text, read) in values:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {read()!r}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        """Write the exposition to path atomically"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+# The registry every module records into
+REGISTRY = MetricsRegistry()
+
+
+def span(stage: str):
+    return REGISTRY.span(stage)
+
+
+def observe(stage: str, seconds: float):
+    REGISTRY.observe(stage, seconds)
+
+
+def timed(stage: str):
+    """Decorator that records every call of the function as one span of stage"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with REGISTRY.span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def start_file_exporter(path: str, interval: float = DEFAULT_WRITE_SECONDS,
+                        registry: MetricsRegistry = REGISTRY) -> threading.Thread:
+    """Rewrite the metrics file every interval seconds on a daemon thread"""
+    def run():
+        while True:
+            try:
+                registry.write(path)
+            except OSError:
+                # A read-only or full disk only costs us the metrics file
+                pass
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='metrics-file', daemon=True)
+    thread.start()
+    return thread
+
+
+def start_http_exporter(port: int, host: str = '127.0.0.1',
+                        registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve the metrics at http://host:port/metrics on a daemon thread"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
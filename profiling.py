@@ -0,0 +1,84 @@
+"""On-demand cProfile and tracemalloc capture of single script reruns
+
+profile_rerun() wraps one rerun: cProfile records the calls made on the
+rerun's thread, which is the session's own script thread in Streamlit, and
+tracemalloc compares the heap before and after to find where the rerun
+allocated. Both are written to a local directory:
+
+    <stamp>-<label>.prof   pstats dump, for pstats, snakeviz or gprof2dot
+    <stamp>-<label>.txt    top functions by cumulative time and the top
+                           allocation sites by size
+
+tracemalloc traces the whole process, and recent Pythons allow one active
+cProfile at a time, so only one rerun is profiled at once; reruns that
+arrive while another is being profiled simply run unprofiled.
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+PROFILE_TOP_FUNCTIONS = 40
+PROFILE_TOP_ALLOCATIONS = 25
+# Frames kept per allocation; more frames make traces more useful and tracing slower
+TRACEMALLOC_FRAMES = 5
+
+_profiling = threading.Lock()
+
+
+def _report(profile: cProfile.Profile, allocations, peak: int, elapsed: float, label: str) -> str:
+    out = io.StringIO()
+    out.write(f"Rerun {label}: {elapsed * 1000:.1f} ms, traced memory peak {peak / 1024:.0f} KiB\n\n")
+    out.write(f"Top {PROFILE_TOP_FUNCTIONS} functions by cumulative time\n")
+    pstats.Stats(profile, stream=out).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP_FUNCTIONS)
+    out.write(f"Top {PROFILE_TOP_ALLOCATIONS} allocation sites during the rerun\n")
+    for stat in allocations[:PROFILE_TOP_ALLOCATIONS]:
+        frame = stat.traceback[0]
+        out.write(f"{stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} blocks  {frame.filename}:{frame.lineno}\n")
+    return out.getvalue()
+
+
+@contextmanager
+def profile_rerun(directory: Optional[str], label: str = 'rerun') -> Iterator[Optional[str]]:
+    """Profile the block into directory, or do nothing when directory is None
+
+    Yields the base path the files are written to, or None when this rerun
+    is not profiled. The files are written even if the block raises, since
+    Streamlit ends reruns with exceptions.
+    """
+    if not directory or not _profiling.acquire(blocking=False):
+        yield None
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{label}")
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            yield base
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - started
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            # Leave out the profiler's and tracemalloc's own bookkeeping
+            ignored = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+            allocations = after.filter_traces(ignored).compare_to(before.filter_traces(ignored), 'lineno')
+            profile.dump_stats(base + '.prof')
+            with open(base + '.txt', 'w', encoding='utf-8') as f:
+                f.write(_report(profile, allocations, peak, elapsed, label))
+    finally:
+        _profiling.release()
@@ -0,0 +1,104 @@
+"""HTML for the product table, built as one string per page
+
+The widget-based table sends a dozen markdown elements plus a columns block
+and two buttons for every product row. Building the page's static table as
+a single HTML string lets the product_table component render it with one
+element, handling the ➕/➖ clicks in the browser.
+
+The product_list component goes further and virtualizes the whole listing:
+the browser scrolls through all rows, and the server only serializes the
+window of rows around the viewport.
+
+For the catalog_browser component the whole catalog is shipped once per
+version as gzip-compressed JSON, keyed by a content hash the browser uses
+like an ETag, and search, filtering and paging all happen client-side.
+"""
+import base64
+import gzip
+import hashlib
+import json
+from html import escape
+from typing import List, Mapping, Sequence, Tuple
+
+from catalog import CATEGORY_SEPARATOR, SUB_CATEGORY_SEPARATOR, Catalog
+
+TABLE_HEADERS = ['البند', 'المنشأ', 'السعر', 'الكمية', 'التحكم', 'الإجمالي الجزئي']
+# Rows sent to the virtualized list per window; the browser asks for the next one as it scrolls
+VIRTUAL_WINDOW_ROWS = 120
+
+
+def product_row_html(catalog: Catalog, index: int, quantity: int) -> str:
+    """One product row with data attributes the component's buttons act on"""
+    price = catalog.prices[index]
+    subtotal = quantity * price if quantity > 0 else 0
+    return (
+        f'<tr class="table-row" data-gid="{index}">'
+        f'<td class="product-name-cell">{escape(catalog.names[index])}</td>'
+        f'<td class="origin-cell">{escape(catalog.origin(index))}</td>'
+        f'<td class="price-cell">{price} ج.م</td>'
+        f'<td class="qty-cell"><span class="qty-display">{quantity}</span></td>'
+        f'<td class="controls-cell">'
+        f'<button type="button" class="qty-btn" data-change="-1" title="تقليل الكمية"'
+        f'{" disabled" if quantity == 0 else ""}>➖</button>'
+        f'<button type="button" class="qty-btn" data-change="1" title="زيادة الكمية">➕</button>'
+        f'</td>'
+        f'<td class="subtotal-cell">{subtotal} ج.م</td>'
+        f'</tr>'
+    )
+
+
+def product_page_html(catalog: Catalog, page_rows: Sequence[int], quantities: Mapping[int, int]) -> str:
+    """The whole page of the product table, separators included, as one HTML string
+
+    quantities maps product indices on this page to their cart quantity.
+    """
+    parts = ['<table class="products-table"><thead><tr>']
+    parts.extend(f'<th>{header}</th>' for header in TABLE_HEADERS)
+    parts.append('</tr></thead><tbody>')
+    for row in page_rows:
+        if row == CATEGORY_SEPARATOR:
+            parts.append('<tr class="category-separator"><td colspan="6"></td></tr>')
+        elif row == SUB_CATEGORY_SEPARATOR:
+            parts.append('<tr class="sub-category-separator"><td colspan="6"></td></tr>')
+        else:
+            parts.append(product_row_html(catalog, row, quantities.get(row, 0)))
+    parts.append('</tbody></table>')
+    return ''.join(parts)
+
+
+def window_rows(catalog: Catalog, rows: Sequence[int], start: int, quantities: Mapping[int, int],
+                count: int = VIRTUAL_WINDOW_ROWS) -> List[list]:
+    """Compact rows[start:start + count] for the product_list component
+
+    Separators are sent as [marker], products as [id, name, origin, price, quantity].
+    """
+    window = []
+    for row in rows[start:start + count]:
+        if row < 0:
+            window.append([row])
+        else:
+            window.append([row, catalog.names[row], catalog.origin(row), catalog.prices[row],
+                           quantities.get(row, 0)])
+    return window
+
+
+def _build_client_payload(catalog: Catalog) -> Tuple[str, str]:
+    columns = {
+        'names': list(catalog.names),
+        'prices': catalog.prices.tolist(),
+        'categories': catalog.categories,
+        'category_codes': catalog.category_codes.tolist(),
+        'origins': catalog.origins,
+        'origin_codes': catalog.origin_codes.tolist(),
+        'separators': catalog.separators.tolist(),
+    }
+    raw = json.dumps(columns, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = hashlib.sha1(raw).hexdigest()[:16]
+    # mtime=0 keeps the bytes, and so the cached copy in the browser, stable across restarts
+    compressed = gzip.compress(raw, compresslevel=6, mtime=0)
+    return etag, base64.b64encode(compressed).decode('ascii')
+
+
+def client_catalog_payload(catalog: Catalog) -> Tuple[str, str]:
+    """(etag, base64 gzip JSON columns) for the catalog_browser component, built once per version"""
+    return catalog.derived('client_payload', _build_client_payload)
@@ -0,0 +1,237 @@
+"""Arabic-aware product name search backed by a trigram index
+
+Names and queries go through the same normalization, so spelling variants
+match each other: alef/hamza forms, ya/alef maqsura, ta marbuta, diacritics,
+tatweel and Arabic-Indic digits. Every query term must appear in the name.
+Candidates come from the posting list of the rarest query trigram and are
+then checked exactly, so a search touches only a small slice of the catalog.
+
+fuzzy_search ranks names by how many of the query's trigrams they
+contain instead, so typos and partial spellings still find the part, best
+match first.
+"""
+import heapq
+import math
+import re
+import time
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from catalog import Catalog
+
+NGRAM = 3
+# Default limits for ranked fuzzy search
+FUZZY_TOP_K = 60
+FUZZY_BUDGET_SECONDS = 0.05
+FUZZY_MIN_SIMILARITY = 0.2
+# Posting entries counted between two looks at the fuzzy search deadline
+FUZZY_CHECK_EVERY = 1024
+# Share of the fuzzy budget for counting shared trigrams, the rest is for scoring
+FUZZY_COUNT_SHARE = 0.5
+
+_TRANSLATION = {ord(c): 'ا' for c in 'أإآٱ'}
+_TRANSLATION.update({
+    ord('ى'): 'ي',
+    ord('ئ'): 'ي',
+    ord('ؤ'): 'و',
+    ord('ة'): 'ه',
+    ord('ـ'): None,  # tatweel
+})
+# Tashkeel (fathatan .. sukun) and the superscript alef
+_TRANSLATION.update({code: None for code in range(0x064B, 0x0653)})
+_TRANSLATION[0x0670] = None
+# Arabic-Indic and extended (Persian) digits
+_TRANSLATION.update({0x0660 + d: str(d) for d in range(10)})
+_TRANSLATION.update({0x06F0 + d: str(d) for d in range(10)})
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_arabic(text: str) -> str:
+    """Fold Arabic spelling variants and case so equivalent names compare equal"""
+    return _WHITESPACE.sub(' ', text.lower().translate(_TRANSLATION)).strip()
+
+
+def query_terms(query: str) -> List[str]:
+    return normalize_arabic(query).split()
+
+
+def _ngrams(word: str):
+    return (word[i:i + NGRAM] for i in range(len(word) - NGRAM + 1))
+
+
+def _word_grams(text: str) -> set:
+    """Trigrams of every word padded with spaces, so word edges and short words count
+
+    The unpadded trigrams used for substring lookups are a subset of these.
+    """
+    grams = set()
+    for word in text.split():
+        grams.update(_ngrams(f' {word} '))
+    return grams
+
+
+class SearchIndex:
+    """Normalized names plus a trigram posting list, built once per catalog"""
+
+    def __init__(self, names: Sequence[str]):
+        self.names = ()
+        self.gram_counts = array('H')
+        self.postings: Dict[str, array] = {}
+        self._add(names)
+
+    def _add(self, names: Sequence[str]):
+        """Index names as the next products after the ones already indexed"""
+        start = len(self.names)
+        normalized = tuple(normalize_arabic(name) for name in names)
+        postings: Dict[str, List[int]] = {}
+        for index, name in enumerate(normalized, start):
+            grams = _word_grams(name)
+            self.gram_counts.append(min(len(grams), 0xFFFF))
+            for gram in grams:
+                bucket = postings.get(gram)
+                if bucket is None:
+                    postings[gram] = [index]
+                else:
+                    bucket.append(index)
+        self.names += normalized
+        # Posting lists are ascending, so candidates come out in sheet order
+        for gram, indices in postings.items():
+            posting = self.postings.get(gram)
+            if posting is None:
+                self.postings[gram] = array('I', indices)
+            else:
+                posting.extend(indices)
+
+    @classmethod
+    def from_parts(cls, names: Sequence[str], gram_counts, postings: Dict[str, Sequence[int]]) -> 'SearchIndex':
+        """An index over already normalized names, e.g. with posting lists that are views into shared memory"""
+        index = cls(())
+        index.names = tuple(names)
+        index.gram_counts = gram_counts
+        index.postings = postings
+        return index
+
+    def extended(self, names: Sequence[str]) -> 'SearchIndex':
+        """A copy of this index with names appended, for a catalog that only grew at the end"""
+        index = SearchIndex(())
+        index.names = self.names
+        index.gram_counts = array('H', self.gram_counts)
+        index.postings = {gram: array('I', posting) for gram, posting in self.postings.items()}
+        index._add(names)
+        return index
+
+    def candidates(self, terms: Sequence[str]) -> Optional[Sequence[int]]:
+        """Smallest posting list covering the query, or None if no term is long enough"""
+        best = None
+        for term in terms:
+            for gram in _ngrams(term):
+                posting = self.postings.get(gram)
+                if posting is None:
+                    return ()
+                if best is None or len(posting) < len(best):
+                    best = posting
+        return best
+
+    def search(self, query: str, within: Optional[Sequence[int]] = None) -> List[int]:
+        """Indices of products whose name contains every query term, in sheet order
+
+        within optionally restricts the search to an ascending list of indices.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return list(within) if within is not None else list(range(len(self.names)))
+
+        candidates = self.candidates(terms)
+        if candidates is None:
+            # Only one- and two-letter terms: scan, they match most names anyway
+            candidates = within if within is not None else range(len(self.names))
+        elif within is not None and len(within) < len(candidates):
+            candidates = within
+
+        names = self.names
+        # One term at a time, longest (most selective) first: each pass only checks the survivors
+        matches = candidates
+        for term in sorted(terms, key=len, reverse=True):
+            matches = [i for i in matches if term in names[i]]
+
+        if within is not None and candidates is not within:
+            allowed = set(within)
+            matches = [i for i in matches if i in allowed]
+        return matches
+
+    def fuzzy_search(self, query: str, k: int = FUZZY_TOP_K, within: Optional[Sequence[int]] = None,
+                     budget_seconds: float = FUZZY_BUDGET_SECONDS,
+                     min_similarity: float = FUZZY_MIN_SIMILARITY) -> List[Tuple[int, float]]:
+        """Top-k (index, score) pairs ranked by trigram containment, best first
+
+        A name scores the share of the query's trigrams it contains, so one
+        mistyped word still matches a long name; names containing every query
+        term exactly score above any fuzzy match. Among equal scores, names
+        whose trigram sets are closer to the query's come first.
+
+        budget_seconds bounds the whole call. Posting lists are counted rarest
+        first and names are scored from the most shared trigrams down; once the
+        budget is spent the remaining, most common trigrams and weakest
+        candidates are skipped, which keeps latency bounded on large catalogs
+        at a small cost in recall.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        grams = _word_grams(' '.join(terms))
+        postings = sorted((self.postings[gram] for gram in grams if gram in self.postings), key=len)
+
+        started = time.perf_counter()
+        deadline = started + budget_seconds
+        count_deadline = started + budget_seconds * FUZZY_COUNT_SHARE
+        shared = Counter()
+        for posting in postings:
+            # Long lists in slices, so one common trigram cannot overrun the budget
+            for start in range(0, len(posting), FUZZY_CHECK_EVERY):
+                shared.update(posting[start:start + FUZZY_CHECK_EVERY])
+                if time.perf_counter() > count_deadline:
+                    break
+            if time.perf_counter() > count_deadline:
+                break
+
+        query_size = len(grams)
+        min_shared = max(1, math.ceil(min_similarity * query_size))
+        by_count: List[List[int]] = [[] for _ in range(query_size + 1)]
+        for index, count in shared.items():
+            if count >= min_shared:
+                by_count[count].append(index)
+
+        allowed = set(within) if within is not None else None
+        names = self.names
+        gram_counts = self.gram_counts
+        best: List[Tuple[float, float, int]] = []
+        for count in range(query_size, min_shared - 1, -1):
+            containment = count / query_size
+            if len(best) == k and best[0][0] >= 1.0 + containment:
+                # Nothing sharing fewer trigrams can beat the top k
+                break
+            for n, index in enumerate(by_count[count]):
+                if n % FUZZY_CHECK_EVERY == 0 and time.perf_counter() > deadline:
+                    break
+                if allowed is not None and index not in allowed:
+                    continue
+                name = names[index]
+                score = containment + (1.0 if all(term in name for term in terms) else 0.0)
+                # Jaccard similarity of the two trigram sets breaks ties
+                item = (score, count / (query_size + gram_counts[index] - count), -index)
+                if len(best) < k:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+            else:
+                continue
+            break
+        best.sort(reverse=True)
+        return [(-negative_index, score) for score, _, negative_index in best]
+
+
+def get_search_index(catalog: Catalog) -> SearchIndex:
+    """The search index for this catalog version, built on first use"""
+    return catalog.derived('search', lambda c: SearchIndex(c.names))
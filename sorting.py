@@ -0,0 +1,106 @@
+"""Sort orders for the product list as permutations built once per catalog version
+
+Each order is an argsort of the whole catalog, kept with its inverse (every
+product's rank). Sorting a filtered result never compares names or prices
+again: large results are gathered by walking the permutation and keeping
+the products in the result, small ones are ordered by their precomputed
+rank.
+"""
+from array import array
+from typing import Dict, List, Sequence
+
+from catalog import CATEGORY_SEPARATOR, Catalog
+from search import get_search_index, normalize_arabic
+
+SORT_DEFAULT = 'default'
+SORT_PRICE_ASC = 'price_asc'
+SORT_PRICE_DESC = 'price_desc'
+SORT_NAME = 'name'
+SORT_CATEGORY = 'category'
+
+# Labels for the sort select box, in display order
+SORT_LABELS: Dict[str, str] = {
+    SORT_DEFAULT: 'الترتيب الافتراضي',
+    SORT_PRICE_ASC: 'السعر: من الأقل للأعلى',
+    SORT_PRICE_DESC: 'السعر: من الأعلى للأقل',
+    SORT_NAME: 'أبجديا داخل كل فئة',
+    SORT_CATEGORY: 'حسب الفئة',
+}
+# Orders that keep products of a category together, so category separators still make sense
+GROUPED_SORTS = frozenset({SORT_NAME, SORT_CATEGORY})
+# Results smaller than 1/GATHER_RATIO of the catalog are ordered by rank instead of gathered
+GATHER_RATIO = 8
+
+
+def _sort_key(catalog: Catalog, order: str):
+    prices = catalog.prices
+    category_codes = catalog.category_codes
+    if order == SORT_PRICE_ASC:
+        return lambda i: (prices[i], i)
+    if order == SORT_PRICE_DESC:
+        return lambda i: (-prices[i], i)
+
+    # Category names and product names compared in their normalized Arabic spelling
+    category_rank = _category_ranks(catalog)
+    if order == SORT_NAME:
+        names = get_search_index(catalog).names
+        return lambda i: (category_rank[category_codes[i]], names[i], i)
+    if order == SORT_CATEGORY:
+        return lambda i: (category_rank[category_codes[i]], i)
+    raise ValueError(f"Unknown sort order: {order}")
+
+
+def _category_ranks(catalog: Catalog) -> List[int]:
+    """Rank of every category code when categories are ordered by name"""
+    ordered = sorted(range(len(catalog.categories)), key=lambda code: normalize_arabic(catalog.categories[code]))
+    rank = [0] * len(ordered)
+    for position, code in enumerate(ordered):
+        rank[code] = position
+    return rank
+
+
+def _build_permutation(order: str):
+    def build(catalog: Catalog):
+        permutation = array('I', sorted(range(len(catalog)), key=_sort_key(catalog, order)))
+        rank = array('I', bytes(4 * len(permutation)))
+        for position, index in enumerate(permutation):
+            rank[index] = position
+        return permutation, rank
+    return build
+
+
+def sort_permutation(catalog: Catalog, order: str):
+    """(permutation, rank) of the whole catalog for order, built on first use"""
+    return catalog.derived(f'sort:{order}', _build_permutation(order))
+
+
+def sorted_products(catalog: Catalog, product_indices: Sequence[int], order: str) -> Sequence[int]:
+    """product_indices in the given order, using the precomputed permutation"""
+    if order == SORT_DEFAULT:
+        return product_indices
+    permutation, rank = sort_permutation(catalog, order)
+    if len(product_indices) * GATHER_RATIO < len(permutation):
+        return sorted(product_indices, key=rank.__getitem__)
+
+    keep = bytearray(len(permutation))
+    for i in product_indices:
+        keep[i] = 1
+    return [i for i in permutation if keep[i]]
+
+
+def group_sorted(catalog: Catalog, product_indices: Sequence[int]) -> List[int]:
+    """Sorted products with a CATEGORY_SEPARATOR wherever the category changes
+
+    The sheet's blank rows mark positions in sheet order, so they are not
+    carried into a sorted view.
+    """
+    layout = []
+    category_codes = catalog.category_codes
+    current_category = None
+    for i in product_indices:
+        category = category_codes[i]
+        if current_category is not None and category != current_category:
+            layout.append(CATEGORY_SEPARATOR)
+        layout.append(i)
+        current_category = category
+    return layout
@@ -0,0 +1,23 @@
+"""Shared test setup: the app's modules on the import path and a catalog factory"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import REQUIRED_COLUMNS, build_catalog  # noqa: E402
+
+
+@pytest.fixture
+def make_catalog():
+    """Builds a catalog from (category, name, origin, price) rows; prices may be numbers"""
+    def make(rows):
+        return build_catalog(REQUIRED_COLUMNS, [[str(cell) for cell in row] for row in rows])
+    return make
+
+
+@pytest.fixture
+def oils(make_catalog):
+    """Builds a catalog of 'زيت' rows from 'مصر' in one category, one row per price given"""
+    return lambda *prices: make_catalog([['زيوت', 'زيت', 'مصر', price] for price in prices])
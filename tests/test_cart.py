@@ -0,0 +1,32 @@
+"""Cart lines following their rows onto a new catalog version"""
+from cart import Cart
+
+
+def test_reprice_keeps_rows_with_the_same_name_and_origin_apart(oils):
+    cart = Cart(catalog_version=1)
+    old = oils(10, 50)
+    cart.change(old, 0, 2)
+    cart.change(old, 1, 1)
+
+    repriced, removed = cart.reprice(oils(12, 50), catalog_version=2)
+
+    assert removed == []
+    assert [(line.product_id, old_price, line.price) for line, old_price in repriced] == [(0, 10, 12)]
+    assert sorted((line.product_id, line.quantity, line.price) for line in cart) == [(0, 2, 12), (1, 1, 50)]
+    assert cart.total_items == 3
+    assert cart.total_cost == 74
+
+
+def test_reprice_follows_moved_rows_and_drops_vanished_ones(make_catalog):
+    cart = Cart(catalog_version=1)
+    old = make_catalog([['زيوت', 'زيت', 'مصر', 10], ['فلاتر', 'فلتر', 'ألمانيا', 30]])
+    cart.change(old, 0, 1)
+    cart.change(old, 1, 2)
+
+    new = make_catalog([['فلاتر', 'فلتر', 'ألمانيا', 30], ['زيوت', 'زيت', 'الصين', 10]])
+    repriced, removed = cart.reprice(new, catalog_version=2)
+
+    assert repriced == []
+    assert [line.name for line in removed] == ['زيت']
+    assert [(line.product_id, line.quantity) for line in cart] == [(0, 2)]
+    assert cart.total_cost == 60
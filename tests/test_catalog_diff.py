@@ -0,0 +1,15 @@
+"""Row-level diffs between catalog versions"""
+from catalog_diff import diff_catalogs
+
+
+def test_reprice_of_a_later_duplicate_row_is_reported(oils):
+    diff = diff_catalogs(oils(10, 50), oils(10, 55))
+
+    assert diff.repriced == {('زيوت', 'زيت', 'مصر', 1): (50, 55)}
+    assert diff.added == [] and diff.removed == []
+
+
+def test_dropped_duplicate_row_is_reported_as_removed(oils):
+    diff = diff_catalogs(oils(10, 50, 70), oils(10, 50))
+
+    assert diff.removed == [('زيوت', 'زيت', 'مصر', 2)]
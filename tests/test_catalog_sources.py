@@ -0,0 +1,142 @@
+"""GoogleSheetSource against a stand-in worksheet that records every range requested"""
+import json
+import re
+import time
+
+from catalog import REQUIRED_COLUMNS, build_catalog
+from catalog_sources import GoogleSheetSource
+
+EXTRA_COLUMNS = ['ملاحظات', 'المورد', 'المخزون', 'كود المورد']
+_A1_COLUMN = re.compile(r'^([A-Z]+)2:([A-Z]+)$')
+
+
+def _column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def _trim(values):
+    """Drop trailing empty cells the way the Sheets API does"""
+    end = len(values)
+    while end and values[end - 1] == '':
+        end -= 1
+    return list(values[:end])
+
+
+class RecordingWorksheet:
+    """Stand-in for gspread.Worksheet over an in-memory grid, recording every request"""
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.requests = []
+        self.bytes_sent = 0
+        # Time spent playing the server, left out of client-side timings
+        self.serve_seconds = 0.0
+
+    def _respond(self, payload, started):
+        self.bytes_sent += len(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+        self.serve_seconds += time.perf_counter() - started
+        return payload
+
+    def get_all_values(self):
+        started = time.perf_counter()
+        self.requests.append(['<all>'])
+        width = max(len(row) for row in self.grid)
+        return self._respond([list(row) + [''] * (width - len(row)) for row in self.grid], started)
+
+    def batch_get(self, ranges, major_dimension='ROWS'):
+        started = time.perf_counter()
+        self.requests.append(list(ranges))
+        results = []
+        for a1 in ranges:
+            if a1 == '1:1':
+                header = _trim(self.grid[0])
+                if major_dimension == 'COLUMNS':
+                    results.append([[cell] for cell in header])
+                else:
+                    results.append([header] if header else [])
+                continue
+            match = _A1_COLUMN.match(a1)
+            if not match or match.group(1) != match.group(2) or major_dimension != 'COLUMNS':
+                raise ValueError(f"Stand-in does not support range {a1!r}")
+            c = _column_index(match.group(1))
+            column = _trim([row[c] if c < len(row) else '' for row in self.grid[1:]])
+            results.append([column] if column else [])
+        return self._respond(results, started)
+
+
+class StandInSheetSource(GoogleSheetSource):
+    def __init__(self, worksheet):
+        super().__init__({}, 'stand-in')
+        self.worksheet = worksheet
+
+    def _open_worksheet(self):
+        return self.worksheet
+
+
+def office_sheet(rows):
+    """Sheet with the required columns spread between the office's extra columns, blank rows kept blank"""
+    headers = [REQUIRED_COLUMNS[0], EXTRA_COLUMNS[0], REQUIRED_COLUMNS[1], REQUIRED_COLUMNS[2],
+               EXTRA_COLUMNS[1], EXTRA_COLUMNS[2], REQUIRED_COLUMNS[3], EXTRA_COLUMNS[3]]
+    grid = [headers]
+    for n, (category, name, origin, price) in enumerate(rows):
+        if not name:
+            grid.append([''] * len(headers))
+            continue
+        grid.append([category, f'ملاحظة رقم {n} عن الصنف', name, origin,
+                     'شركة النور للتوريدات', str(n % 50), price, f'SUP-{n:06d}'])
+    return grid
+
+
+def same_catalog(a, b):
+    return (a.names == b.names and list(a.prices) == list(b.prices) and a.categories == b.categories
+            and list(a.category_codes) == list(b.category_codes) and a.origins == b.origins
+            and list(a.origin_codes) == list(b.origin_codes) and list(a.separators) == list(b.separators))
+
+
+ROWS = [
+    ['فلاتر', 'فلتر زيت لانسر', 'ياباني', '120'],
+    ['فلاتر', 'فلتر هواء فيرنا', 'كوري', '٩٥'],
+    ['', '', '', ''],
+    ['فرامل', 'تيل أمامي فيرنا', 'كوري', '1,250'],
+    ['فرامل', 'تيل خلفي لانسر', '', '300'],
+]
+
+
+def test_refresh_is_one_request_for_the_required_columns():
+    sheet = RecordingWorksheet(office_sheet(ROWS))
+    source = StandInSheetSource(sheet)
+    source.fetch()
+    sheet.requests.clear()
+
+    source.fetch()
+
+    assert sheet.requests == [['1:1', 'A2:A', 'C2:C', 'D2:D', 'G2:G']]
+
+
+def test_column_fetch_parses_like_get_all_values():
+    grid = office_sheet(ROWS)
+    all_values = RecordingWorksheet(grid).get_all_values()
+    expected = build_catalog(all_values[0], all_values[1:])
+
+    headers, rows = StandInSheetSource(RecordingWorksheet(grid)).fetch()
+
+    assert same_catalog(expected, build_catalog(headers, rows))
+
+
+def test_moved_columns_are_resolved_again():
+    grid = office_sheet(ROWS)
+    expected = build_catalog(grid[0], grid[1:])
+    sheet = RecordingWorksheet(grid)
+    source = StandInSheetSource(sheet)
+    source.fetch()
+
+    # The office swaps the category and price columns
+    sheet.grid = [[row[6], row[1], row[2], row[3], row[4], row[5], row[0], row[7]] for row in grid]
+    sheet.requests.clear()
+    headers, rows = source.fetch()
+
+    assert same_catalog(expected, build_catalog(headers, rows))
+    assert sheet.requests == [['1:1', 'A2:A', 'C2:C', 'D2:D', 'G2:G'], ['1:1', 'G2:G', 'C2:C', 'D2:D', 'A2:A']]
@@ -0,0 +1,65 @@
+"""Single-flight loading of a cold CatalogStore"""
+import threading
+import time
+
+from catalog_store import CatalogStore
+
+THREADS = 16
+
+
+def test_concurrent_gets_on_a_cold_store_share_one_fetch():
+    calls = []
+    started = threading.Barrier(THREADS)
+
+    def slow_loader():
+        calls.append(threading.current_thread().name)
+        # Long enough for every thread to arrive while the first fetch is in flight
+        time.sleep(0.3)
+        return object()
+
+    store = CatalogStore(slow_loader, refresh_seconds=0, snapshot_path=None)
+    snapshots = [None] * THREADS
+
+    def get(k):
+        started.wait()
+        snapshots[k] = store.get()
+
+    threads = [threading.Thread(target=get, args=(k,)) for k in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert len(calls) == 1
+    assert all(snapshot is snapshots[0] for snapshot in snapshots)
+    assert snapshots[0].version == 1
+
+
+def test_callers_share_the_error_of_a_failed_fetch():
+    calls = []
+    started = threading.Barrier(THREADS)
+
+    def failing_loader():
+        calls.append(1)
+        time.sleep(0.3)
+        raise OSError("source unreachable")
+
+    store = CatalogStore(failing_loader, refresh_seconds=0, snapshot_path=None)
+    errors = []
+
+    def get():
+        started.wait()
+        try:
+            store.get()
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=get) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert len(calls) == 1
+    assert len(errors) == THREADS
+    assert store.snapshot is None
@@ -0,0 +1,28 @@
+"""Facet counts of filtered listings"""
+from listing import compute_listing
+
+ROWS = [
+    ['فلاتر', 'فلتر زيت تويوتا', 'ياباني', '120'],
+    ['فلاتر', 'فلتر زيت هيونداي', 'كوري', '95'],
+    ['فلاتر', 'فلتر هواء هيونداي', 'كوري', '80'],
+    ['زيوت', 'زيت موتور', 'مصر', '300'],
+]
+
+
+def test_typo_query_counts_the_ranked_matches_it_shows(make_catalog):
+    catalog = make_catalog(ROWS)
+
+    listing = compute_listing(catalog, 'فلطر زيت')
+
+    assert listing.ranked and listing.product_count > 0
+    assert sum(listing.origin_counts) == listing.product_count
+    assert sum(listing.category_counts) == listing.product_count
+
+
+def test_typo_query_counts_cover_the_selected_origin(make_catalog):
+    catalog = make_catalog(ROWS)
+
+    listing = compute_listing(catalog, 'فلطر زيت', origins=['كوري'])
+
+    assert listing.ranked
+    assert listing.origin_counts[catalog.origins.index('كوري')] == listing.product_count
@@ -0,0 +1,17 @@
+"""Registered values in the metrics exposition"""
+from listing import LRUCache
+from metrics import MetricsRegistry
+
+
+def test_listing_cache_counters_are_read_at_render():
+    registry = MetricsRegistry()
+    cache = LRUCache(2)
+    registry.register_value('cache_hits_total', 'Hits.', lambda: cache.hits, kind='counter')
+    cache.put('a', 1)
+    cache.get('a')
+    cache.get('b')
+
+    text = registry.render()
+
+    assert '# TYPE cache_hits_total counter' in text
+    assert 'cache_hits_total 1\n' in text
@@ -0,0 +1,33 @@
+"""Exact and ranked product name search"""
+import time
+
+from search import SearchIndex
+
+NAMES = ['فلتر زيت لانسر 7', 'فلتر هواء فيرنا 2', 'تيل أمامي فيرنا 8', 'بوجيه لانسر 4']
+
+
+def test_one_mistyped_word_finds_longer_names():
+    index = SearchIndex(NAMES)
+
+    assert index.search('فلطر') == []
+    found = [NAMES[i] for i, _ in index.fuzzy_search('فلطر')]
+
+    assert found[:2] == ['فلتر زيت لانسر 7', 'فلتر هواء فيرنا 2']
+
+
+def test_exact_matches_rank_first():
+    index = SearchIndex(NAMES)
+
+    ranked = index.fuzzy_search('لانسر')
+
+    assert {NAMES[i] for i, score in ranked if score >= 1.0} == {'فلتر زيت لانسر 7', 'بوجيه لانسر 4'}
+    assert all(score >= 1.0 for _, score in ranked[:2])
+
+
+def test_budget_bounds_the_whole_call():
+    index = SearchIndex([f'فلتر زيت موديل {k}' for k in range(50000)])
+
+    started = time.perf_counter()
+    index.fuzzy_search('فلطر', budget_seconds=0.01)
+
+    assert time.perf_counter() - started < 0.05